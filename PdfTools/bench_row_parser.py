@@ -0,0 +1,92 @@
+# Micro-benchmark for parsing rows (see read_table_to_csv.py)
+"""
+    Compares the compiled `RowParser` with the earlier per-row parsing
+    (which validated and rebuilt the specification for every row) on
+    synthetic lines. Both should give the same columns.
+
+    Example calls:
+    ```bash
+    python ./bench_row_parser.py
+    python ./bench_row_parser.py --num-lines 100000 --spec wwsw
+    ```
+"""
+
+# %%
+import gc
+import sys
+import tyro
+import time
+import random
+from dataclasses import dataclass
+from read_table_to_csv import RowParser
+
+
+# %%
+@dataclass
+class LocalArgs:
+    # Number of synthetic lines
+    num_lines: int = 1_000_000
+    # Row specification
+    spec: str = "wsw"
+    # Max words in the 's' column
+    max_words: int = 6
+    # Seed for the random number generator
+    seed: int = 0
+
+
+# %%
+# Per-row parsing (the earlier implementation, as reference)
+def parse_row_reference(row_data, spec):
+    rd = row_data.split()
+    s = spec
+    assert len(s) == s.count("w") + s.count("s") and \
+            s.count("s") == 1, "Only 'w's and one 's' allowed"
+    s = list(map(lambda x: 1 if x == "w" else x, s))
+    s[s.index("s")] = len(rd) - s.count(1)
+    d = []  # Final row data as columns
+    _i1 = 0 # Track 'rd' read so far
+    for v in s:
+        if v == 1:
+            d.append(rd[_i1])
+        elif v > 1:
+            d.append(" ".join(rd[_i1 : _i1 + v]))
+        _i1 += v
+    return d
+
+
+# %%
+def synthetic_lines(n, spec, max_words, seed=0):
+    rng = random.Random(seed)
+    words = ["alpha", "beta", "gamma", "delta", "epsilon", "zeta"]
+    lines = []
+    for i in range(n):
+        cols = [" ".join(rng.choices(words, k=rng.randint(1,
+                max_words))) if c == "s" else f"{i:,}" for c in spec]
+        lines.append(" ".join(cols))
+    return lines
+
+
+# %%
+def main(args: LocalArgs):
+    print(f"Arguments: {args}")
+    lines = synthetic_lines(args.num_lines, args.spec, args.max_words,
+                            args.seed)
+    gc.disable()    # Like timeit (don't time the garbage collector)
+    start = time.perf_counter()
+    ref = [parse_row_reference(line, args.spec) for line in lines]
+    t_ref = time.perf_counter() - start
+    start = time.perf_counter()
+    parser = RowParser(args.spec)
+    res = [parser(line) for line in lines]
+    t_new = time.perf_counter() - start
+    gc.enable()
+    assert ref == res, "Parsers don't agree"
+    print(f"Reference: {t_ref:.3f}s ({len(lines) / t_ref:.0f} lines/s)")
+    print(f"RowParser: {t_new:.3f}s ({len(lines) / t_new:.0f} lines/s)")
+    print(f"Speedup: {t_ref / t_new:.2f}x")
+
+
+if __name__ == "__main__" and "ipykernel" not in sys.argv[0]:
+    args = tyro.cli(LocalArgs, description=__doc__)
+    main(args)
+    exit(0)
@@ -7,24 +7,43 @@
     - Data in the third column is a number with commas (no spaces). 
         Remove the commas and save number as int.
     
-    Output is a CSV file with the given name.
+    Output is a CSV file with the given name (or a Parquet or Arrow
+    file, based on the extension of the name).
     
     The first 'n' rows of the first page are ignored and the header is
     pre-programmed.
+    
+    With `--cache-dir`, the text of every page is cached on disk. An
+    interrupted run resumes from the pages that were already read, 
+    and runs with different parsing options don't decode the PDF.
+    
+    With `--low-memory`, the memory used stays the same for any size
+    of the PDF file (see `Args.low_memory`).
+    
+    The time of every stage (opening the PDF, reading the cache, 
+    extracting the text, parsing the rows, and writing), pages/s, 
+    rows/s, and a histogram of the time per page can be saved as a 
+    JSON report (`--report-file`). With `--profile`, the run is 
+    profiled (cProfile) and the stats are saved (sorted).
 """
 
 # %%
 import os
+import csv
 import sys
+import json
+import mmap
+import bisect
+import hashlib
 import tyro
 import time
 import PyPDF2
 import traceback
-import pandas as pd
 from tqdm.auto import tqdm
-from PyPDF2 import PdfReader
+from PyPDF2 import PdfReader, PageObject
+from PyPDF2.generic import IndirectObject, NameObject
 from dataclasses import dataclass, field
-from typing import Optional, List
+from typing import Literal, Optional, List
 from joblib import Parallel, delayed
 
 
@@ -49,12 +68,266 @@ class Args:
     # Headings in the output file (should be three columns)
     headings: list[str] = field(default_factory=lambda: 
                                 ["a", "b", "c"])
+    # Types of the columns (None = all are strings, as they're read)
+    """
+        One type for each column: 'str', 'int' (a number with commas,
+        the commas are removed), 'decimal' (a number with commas and
+        decimals, saved exactly with `decimal_scale` decimals), or 
+        'date' (see `date_fmt`). The 
+        columns are converted for a page at a time (as arrays, needs
+        pyarrow). Empty columns are saved as nulls.
+        
+        Eg: For the statements, use 'str str int'.
+    """
+    types: Optional[List[Literal["str", "int", "decimal", "date"]]] \
+            = None
+    # Format of the 'date' columns
+    date_fmt: str = r"%Y-%m-%d"
+    # Number of decimals of the 'decimal' columns (more is an error)
+    decimal_scale: int = 2
     # Number of rows (from top) to skip on the first page
     skip_first_only: int = 2
     # Number of rows (from top) to skip on the second page onwards
     skip_second_onwards: int = 0
     # Number of rows (from bottom) to skip on every page
     skip_last: int = 0
+    # Number of parallel jobs (-1 = all cores)
+    """
+        If more than one job is used, the pages are split into ranges
+        and each job opens the PDF file itself (once, and reuses it 
+        for its next ranges) and extracts the pages in its range 
+        (page objects can't be sent to other processes). The rows are
+        still in the order of the pages.
+    """
+    jobs: int = 1
+    # Number of pages in a range (for parallel jobs; 0 = automatic)
+    pages_per_job: int = 0
+    # Folder to cache the text of the pages (None = no cache)
+    """
+        The raw text of every page is cached (keyed by the hash of the
+        PDF file and the page number). Runs with only different 
+        parsing options (spec, skips, headings) don't decode the PDF,
+        and interrupted runs resume from the pages that were done.
+    """
+    cache_dir: Optional[str] = None
+    # Maximum size of the cache (in MB; the oldest files are evicted)
+    cache_max_mb: float = 512
+    # Low memory mode (for very large files)
+    """
+        The PDF file is memory mapped (instead of being read into
+        memory) and the pages are read one at a time from the page
+        tree (instead of making the list of all pages). The objects
+        read for a page are released after its text is extracted, so
+        the memory doesn't grow with the number of pages (shared 
+        objects, like fonts, are read again for every page).
+    """
+    low_memory: bool = False
+    # Report of the timings (JSON; None = only print the summary)
+    """
+        The time (in seconds) of each stage is summed over the pages
+        (and over the parallel jobs, so it can be more than the total
+        time). The time of a page is from reading its cache (or the
+        PDF) till its rows are parsed.
+    """
+    report_file: Optional[str] = None
+    # Profile the run (cProfile) and save the stats to `profile_file`
+    """
+        Only the main process is profiled (use with one job to profile
+        the reading of the pages).
+    """
+    profile: bool = False
+    # Profile stats (text, sorted by the cumulative time)
+    profile_file: str = "./profile.txt"
+
+
+# %%
+class RowParser:
+    """
+        Parser for the rows of a specification (see `Args.spec`). The
+        specification is validated and compiled once, to the number 
+        of words before (`lead`) and after (`trail`) the 's' column.
+        Each row is then split once and sliced.
+        Parameters:
+        - spec: str     Row specification (like 'wsw')
+    """
+    def __init__(self, spec: str):
+        assert len(spec) == spec.count("w") + spec.count("s") and \
+                spec.count("s") == 1, "Only 'w's and one 's' allowed"
+        self.lead = spec.index("s")
+        self.trail = len(spec) - self.lead - 1
+    
+    def __call__(self, row_data: str) -> list[str]:
+        rd = row_data.split()
+        lead, e = self.lead, len(rd) - self.trail
+        if e < lead:
+            e = lead
+        rd[lead:e] = [" ".join(rd[lead:e])]   # The 's' column
+        return rd
+
+
+# %%
+# Compiled parser for a specification (reused for all pages)
+_row_parsers = {}   # Not `lru_cache`, the parallel jobs pickle it
+def get_row_parser(spec: str) -> RowParser:
+    if spec not in _row_parsers:
+        _row_parsers[spec] = RowParser(spec)
+    return _row_parsers[spec]
+
+
+# %%
+def open_reader(file: str, low_memory: bool = False) -> PdfReader:
+    """
+        Opens the PDF file. `PdfReader` reads the whole file into 
+        memory, so in the low memory mode, it gets a (read-only) 
+        memory map of the file instead.
+    """
+    if not low_memory:
+        return PdfReader(file)
+    with open(file, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return PdfReader(mm)
+
+
+# %%
+# Readers of the process (reused by its page ranges of the same file)
+_readers = {}   # (file, size, mtime, low memory): reader
+def get_reader(file: str, low_memory: bool = False) -> PdfReader:
+    st = os.stat(file)
+    key = (file, st.st_size, st.st_mtime_ns, low_memory)
+    if key not in _readers:
+        _readers.clear()    # One file at a time (memory)
+        _readers[key] = open_reader(file, low_memory)
+    return _readers[key]
+
+
+# %%
+# Number of pages (from the page tree, without reading the pages)
+def count_pages(reader: PdfReader) -> int:
+    return int(reader.trailer["/Root"]["/Pages"]["/Count"])
+
+
+# %%
+_INHERITED = ("/Resources", "/MediaBox", "/CropBox", "/Rotate")
+def iter_pages_lazily(reader: PdfReader, start: int = 0, 
+            end: Optional[int] = None):
+    """
+        Yields the (page number, page object) from `start` to `end`
+        (excluding) by walking the page tree. Subtrees before `start`
+        are skipped using their page count, and no list of all the 
+        pages is made (like `reader.pages` does).
+    """
+    end = count_pages(reader) if end is None else end
+    def walk(node, ref, inherit, first):
+        node = node.get_object()
+        if node.get("/Type", "/Pages") == "/Pages":
+            inherit = {**inherit, 
+                    **{a: node[a] for a in _INHERITED if a in node}}
+            for kid in node["/Kids"]:
+                if first >= end:
+                    return
+                kid_node = kid.get_object()
+                n = int(kid_node.get("/Count", 1)) \
+                    if kid_node.get("/Type", "/Pages") == "/Pages" \
+                    else 1
+                if first + n > start:
+                    yield from walk(kid_node, kid, inherit, first)
+                first += n
+        else:
+            page = PageObject(reader, ref if isinstance(ref, 
+                                        IndirectObject) else None)
+            page.update(node)
+            for a, v in inherit.items():
+                if a not in page:
+                    page[NameObject(a)] = v
+            yield first, page
+    root = reader.trailer["/Root"]["/Pages"]
+    yield from walk(root, root, {}, 0)
+
+
+# %%
+# Hash of the file contents (key for the cache)
+def file_hash(file: str) -> str:
+    h = hashlib.sha256()
+    with open(file, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+# %%
+class PageTextCache:
+    """
+        On-disk cache of the text of the pages of a PDF file (the raw
+        `extract_text()` output, one file per page). Each PDF file has
+        a folder (named by the hash of the file) in `cache_dir`.
+        Parameters:
+        - cache_dir: str    Folder of the cache
+        - key: str          Hash of the PDF file (see `file_hash`)
+    """
+    def __init__(self, cache_dir: str, key: str):
+        self.dir = os.path.join(cache_dir, key)
+        os.makedirs(self.dir, exist_ok=True)
+        os.utime(self.dir)  # Used now (see `evict`)
+    
+    def _path(self, name):
+        return os.path.join(self.dir, name)
+    
+    def get(self, page_no: int) -> Optional[str]:
+        try:
+            with open(self._path(f"{page_no:06d}.txt"), 
+                    encoding="utf-8", newline="") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+    
+    def put(self, page_no: int, text: str):
+        path = self._path(f"{page_no:06d}.txt")
+        with open(f"{path}.tmp", "w", encoding="utf-8", 
+                newline="") as f:
+            f.write(text)
+        os.replace(f"{path}.tmp", path)  # Complete pages only
+    
+    @property
+    def num_pages(self) -> Optional[int]:
+        try:
+            with open(self._path("meta.json")) as f:
+                return json.load(f)["num_pages"]
+        except FileNotFoundError:
+            return None
+    
+    @num_pages.setter
+    def num_pages(self, num_pages: int):
+        with open(self._path("meta.json"), "w") as f:
+            json.dump({"num_pages": num_pages}, f)
+    
+    @staticmethod
+    def evict(cache_dir: str, max_bytes: float, keep=()):
+        """
+            Removes the least recently used PDF files (folders) from
+            the cache till its size is under `max_bytes`. A folder is
+            used when it's opened (or a page is written). The `keep` 
+            folders (keys) are not removed.
+        """
+        entries = []    # (last used, size, folder)
+        for d in os.scandir(cache_dir):
+            if not d.is_dir():
+                continue
+            files = list(os.scandir(d.path))
+            size = sum(f.stat().st_size for f in files)
+            used = max([f.stat().st_mtime for f in files] + 
+                        [d.stat().st_mtime])
+            entries.append((used, size, d.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            if os.path.basename(path) in keep:
+                continue
+            for f in os.scandir(path):
+                os.remove(f.path)
+            os.rmdir(path)
+            total -= size
+            print(f"Evicted from cache: {path}")
 
 
 # %%
@@ -68,38 +341,315 @@ def read_page_lines(page: PyPDF2.PageObject, page_no: int,
         - page_no: int              Page number (None)
         - args: Args                Arguments (for configurations)
     """
+    return parse_page_text(page.extract_text(), page_no, args)
+
+
+# %%
+def parse_page_text(text: str, page_no: int, args: Args):
+    """
+        Parses the text (lines) of a page into columns. Same as 
+        `read_page_lines`, but with the text already extracted.
+    """
     # Arguments
-    spec = args.spec
+    parser = get_row_parser(args.spec)
     skip_first_only = args.skip_first_only
     skip_second_onwards = args.skip_second_onwards
     skip_last = args.skip_last
-    # Extract text
-    pg_data = page.extract_text().splitlines()
+    # Lines of the text
+    pg_data = text.splitlines()
     if page_no == 0:
         pg_data = pg_data[skip_first_only:]
     else:
         pg_data = pg_data[skip_second_onwards:]
-    pg_data = pg_data[:-skip_last]
-    page_content = []
-    for row_data in pg_data:
-        rd = row_data.split()
-        s = spec
-        assert len(s) == s.count("w") + s.count("s") and \
-                s.count("s") == 1, "Only 'w's and one 's' allowed"
-        s = list(map(lambda x: 1 if x == "w" else x, s))
-        s[s.index("s")] = len(rd) - s.count(1)
-        d = []  # Final row data as columns
-        _i1 = 0 # Track 'rd' read so far
-        for v in s:
-            if v == 1:
-                d.append(rd[_i1])
-            elif v > 1:
-                d.append(" ".join(rd[_i1 : _i1 + v]))
-            _i1 += v
-        page_content.append(d)
+    pg_data = pg_data[:len(pg_data) - skip_last]
+    page_content = [parser(row_data) for row_data in pg_data]
     return (page_no, page_content)
 
 
+# %%
+class StageTimer:
+    """
+        Total time (in seconds) of the stages of reading the pages and
+        the time of every page (in ms). Timers of the parallel jobs
+        are merged (see `merge`).
+    """
+    # Upper edges (in ms) of the buckets of the histogram of pages
+    edges = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+    
+    def __init__(self):
+        self.stages = {}        # Stage: seconds
+        self.page_ms = []       # Time of the pages
+    
+    # Adds the time since `start` to the stage (returns the time now)
+    def lap(self, stage: str, start: float) -> float:
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.0) + now - start
+        return now
+    
+    def merge(self, other: "StageTimer"):
+        for stage, t in other.stages.items():
+            self.stages[stage] = self.stages.get(stage, 0.0) + t
+        self.page_ms.extend(other.page_ms)
+    
+    def report(self, num_pages: int, num_rows: int, 
+                total_time: float) -> dict:
+        ms = sorted(self.page_ms)
+        pct = lambda q: ms[min(len(ms) - 1, int(q * len(ms)))] \
+                if ms else None
+        counts = [0] * (len(self.edges) + 1)
+        for t in ms:
+            counts[bisect.bisect_left(self.edges, t)] += 1
+        labels = [f"<={e}" for e in self.edges] + \
+                [f">{self.edges[-1]}"]
+        return {"num_pages": num_pages, "num_rows": num_rows,
+                "total_s": total_time, 
+                "pages_per_s": num_pages / total_time,
+                "rows_per_s": num_rows / total_time,
+                "stages_s": self.stages,
+                "page_ms": {"mean": sum(ms) / len(ms) if ms else None,
+                    "p50": pct(0.5), "p90": pct(0.9), "p99": pct(0.99),
+                    "max": ms[-1] if ms else None,
+                    "histogram": dict(zip(labels, counts))}}
+
+
+# %%
+def iter_page_range(file: str, start: int, end: int, args: Args,
+            cache_key: Optional[str] = None, reader=None,
+            timer: Optional[StageTimer] = None):
+    """
+        Yields the (page number, row content) of the pages from 
+        `start` to `end` (excluding). If `cache_key` is given, the 
+        text of the pages is read from (and saved to) the cache. The
+        PDF file is only opened (if `reader` isn't given) if a page 
+        isn't in the cache. The stages are timed with `timer`.
+    """
+    timer = StageTimer() if timer is None else timer
+    cache = None
+    if cache_key is not None:
+        cache = PageTextCache(args.cache_dir, cache_key)
+    lazy_pages = None   # Page iterator (for the low memory mode)
+    for p in range(start, end):
+        t = t_page = time.perf_counter()
+        text = None if cache is None else cache.get(p)
+        if cache is not None:
+            t = timer.lap("cache", t)
+        if text is None:
+            if reader is None:
+                reader = get_reader(file, args.low_memory)
+                t = timer.lap("open", t)
+            if args.low_memory:
+                if lazy_pages is None:
+                    lazy_pages = iter_pages_lazily(reader, p, end)
+                q, page = next(lazy_pages)
+                while q < p:    # Pages in the cache
+                    q, page = next(lazy_pages)
+                text = page.extract_text()
+                del page
+                reader.resolved_objects.clear() # Release the objects
+                if hasattr(mmap, "MADV_DONTNEED"):  # And the mapped file
+                    reader.stream.madvise(mmap.MADV_DONTNEED)
+            else:
+                text = reader.pages[p].extract_text()
+            t = timer.lap("extract", t)
+            if cache is not None:
+                cache.put(p, text)
+                t = timer.lap("cache", t)
+        page = parse_page_text(text, p, args)
+        t = timer.lap("parse", t)
+        timer.page_ms.append((t - t_page) * 1e3)
+        yield page
+
+
+# %%
+def read_page_range(file: str, start: int, end: int, args: Args,
+            cache_key: Optional[str] = None, 
+            timer: Optional[StageTimer] = None):
+    """
+        Opens the PDF file and reads the pages from `start` to `end`
+        (excluding). Used by the parallel jobs (each job has its own
+        reader). Returns a list of (page number, row content).
+    """
+    return list(iter_page_range(file, start, end, args, cache_key,
+                                timer=timer))
+
+
+# %%
+# Reads a page range (see `read_page_range`) and returns its timer
+def timed_page_range(file: str, start: int, end: int, args: Args,
+            cache_key: Optional[str] = None):
+    timer = StageTimer()
+    pages = read_page_range(file, start, end, args, cache_key, timer)
+    return pages, timer
+
+
+# %%
+def in_page_order(page_data):
+    """
+        Yields the (page number, row content) from `page_data` in the
+        order of the pages (even if they come out of order). Only the
+        pages that came early are held in memory.
+    """
+    pending, next_page = {}, 0
+    for p, rows in page_data:
+        pending[p] = rows
+        while next_page in pending:
+            yield next_page, pending.pop(next_page)
+            next_page += 1
+    assert not pending, f"Missing pages before {min(pending)}"
+
+
+# %%
+def open_pdf(file: str, args: Args, verbose: bool = True):
+    """
+        Returns the (cache key, number of pages, reader) of the PDF 
+        file. If the file is in the cache (see `Args.cache_dir`), the
+        file isn't opened (the reader is None).
+    """
+    cache_key, num_pages, reader = None, None, None
+    if args.cache_dir is not None:
+        cache_key = file_hash(file)
+        cache = PageTextCache(args.cache_dir, cache_key)
+        num_pages = cache.num_pages
+        if verbose:
+            print(f"Using the cache: {cache.dir}")
+    if num_pages is None:
+        reader = open_reader(file, args.low_memory)
+        if verbose:
+            print(reader.metadata)
+        num_pages = count_pages(reader) if args.low_memory \
+                    else len(reader.pages)
+        if cache_key is not None:
+            cache.num_pages = num_pages
+    return cache_key, num_pages, reader
+
+
+# %%
+# Page ranges (start, end) for the parallel jobs
+def page_ranges(num_pages: int, args: Args):
+    n_jobs = os.cpu_count() if args.jobs < 0 else args.jobs
+    step = args.pages_per_job or \
+            max(1, min(16, -(-num_pages // (4 * n_jobs))))
+    return [(s, min(s + step, num_pages)) 
+            for s in range(0, num_pages, step)]
+
+
+# %%
+# Arrow type of the column types (see `Args.types`)
+def arrow_type(col_type: str, decimal_scale: int = 2):
+    import pyarrow as pa
+    if col_type == "decimal":
+        return pa.decimal128(38, decimal_scale)
+    return {"str": pa.string(), "int": pa.int64(), 
+            "date": pa.date32()}[col_type]
+
+
+# %%
+def page_table(rows: list[list[str]], headings: list[str], 
+            types: list[str], date_fmt: str = r"%Y-%m-%d", 
+            decimal_scale: int = 2):
+    """
+        Converts the rows (of a page) to a `pyarrow.Table` with the
+        given column types (see `Args.types`). Each column is 
+        converted as one array. Missing columns are nulls.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    cols = {}
+    for k, (h, t) in enumerate(zip(headings, types)):
+        col = pa.array([r[k] if k < len(r) else None for r in rows],
+                        type=pa.string())
+        if t in ("int", "decimal"):
+            col = pc.replace_substring(col, ",", "")\
+                    .cast(arrow_type(t, decimal_scale))
+        elif t == "date":
+            col = pc.strptime(col, format=date_fmt, unit="s")\
+                    .cast(pa.date32())
+        cols[h] = col
+    return pa.table(cols)
+
+
+# %%
+class TableWriter:
+    """
+        Writes the rows of the pages to `out_file` (page by page). The
+        format is based on the extension: '.parquet', '.arrow' or 
+        '.feather' (Arrow IPC file), or CSV (anything else). Parquet 
+        and Arrow files have typed columns (strings if `types` isn't
+        given) and are written in groups of `group_rows` rows. 
+        Parameters:
+        - out_file: str         Output file
+        - headings: list[str]   Column names
+        - types: list[str]      Column types (see `Args.types`)
+        - date_fmt: str         Format of the 'date' columns
+        - decimal_scale: int    Decimals of the 'decimal' columns
+        - group_rows: int       Rows in a group (Parquet and Arrow)
+    """
+    def __init__(self, out_file: str, headings: list[str], 
+                types: Optional[list[str]] = None, 
+                date_fmt: str = r"%Y-%m-%d", decimal_scale: int = 2,
+                group_rows: int = 65536):
+        self.headings, self.date_fmt = list(headings), date_fmt
+        self.decimal_scale = decimal_scale
+        self.types = list(types) if types is not None else None
+        if self.types is not None:
+            assert len(self.types) == len(self.headings), \
+                    "Need a type for each heading"
+        self.fmt = "parquet" if out_file.endswith(".parquet") else \
+                "arrow" if out_file.endswith((".arrow", ".feather")) \
+                else "csv"
+        self.group_rows, self.pending, self.num_pending = \
+                group_rows, [], 0
+        if self.fmt == "csv":
+            self.f = open(out_file, "w", newline="")
+            self.writer = csv.writer(self.f, lineterminator="\n")
+            self.writer.writerow(self.headings)
+            return
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        if self.types is None:
+            self.types = ["str"] * len(self.headings)
+        self.schema = pa.schema([(h, arrow_type(t, decimal_scale)) 
+                    for h, t in zip(self.headings, self.types)])
+        self.writer = pq.ParquetWriter(out_file, self.schema) \
+                if self.fmt == "parquet" else \
+                pa.ipc.new_file(out_file, self.schema)
+    
+    def write(self, rows: list[list[str]], page_no: int = None):
+        if self.fmt == "csv" and self.types is None:
+            self.writer.writerows(rows)
+            return
+        try:
+            table = page_table(rows, self.headings, self.types, 
+                                self.date_fmt, self.decimal_scale)
+        except Exception as exc:
+            raise ValueError(f"Page {page_no}: {exc}") from exc
+        if self.fmt == "csv":
+            self.writer.writerows(zip(*(["" if v is None else v 
+                    for v in col.to_pylist()] for col in table.columns)))
+            return
+        self.pending.append(table)
+        self.num_pending += len(table)
+        if self.num_pending >= self.group_rows:
+            self.flush()
+    
+    def flush(self):
+        if self.pending:
+            import pyarrow as pa
+            table = pa.concat_tables(self.pending)
+            if self.fmt == "parquet":
+                self.writer.write_table(table)
+            else:
+                self.writer.write(table)
+        self.pending, self.num_pending = [], 0
+    
+    def close(self):
+        if self.fmt == "csv":
+            self.f.close()
+            return
+        self.flush()
+        self.writer.close()
+
+
 # %%
 def main(args: Args):
     print(f"Arguments: {args}")
@@ -108,33 +658,78 @@ def main(args: Args):
     file = _ex(args.file)
     assert os.path.isfile(file) and file.endswith(".pdf"), \
             "Should be a PDF file on disk"
-    # Read the file metadata
-    reader = PdfReader(file)
+    # Read the file metadata (or the cache)
     print(f"Reading file: {file}")
-    print(reader.metadata)
-    # Read contents
-    all_page_data = []
-    for p, page in enumerate(tqdm(reader.pages)):
-        _, res = read_page_lines(page, p, args)
-        all_page_data.append((p, res))  # (page number, row content)
-    # all_page_data2 = Parallel(n_jobs=-1)(delayed(read_page_lines)\
-    #         (page, i) for i, page in enumerate(tqdm(reader.pages)))
-    data = []
+    timer, start_time = StageTimer(), time.perf_counter()
+    cache_key, num_pages, reader = open_pdf(file, args)
+    timer.lap("open", start_time)
+    # Read contents (as (page number, row content), in any order)
+    if args.jobs == 1:
+        page_data = iter_page_range(file, 0, num_pages, args, 
+                                    cache_key, reader, timer)
+        page_data = tqdm(page_data, total=num_pages)
+    else:
+        ranges = page_ranges(num_pages, args)
+        # From the module (functions of `__main__` are sent with a copy
+        # of their globals), so a job reuses its reader (`get_reader`)
+        from read_table_to_csv import timed_page_range as job
+        res = Parallel(n_jobs=args.jobs, 
+                return_as="generator_unordered")(
+                delayed(job)(file, s, e, args, cache_key) 
+                for s, e in ranges)
+        def _pages():
+            for pages, job_timer in tqdm(res, total=len(ranges)):
+                timer.merge(job_timer)
+                yield from pages
+        page_data = _pages()
+    # Write the rows as the pages are ready (in the order of pages)
     header = list(args.headings)
     print(f"Using the headings: {header}")
-    for p, page in all_page_data:   # (page number, data)
-        data.extend(page)
-    df = pd.DataFrame(data, columns=header)
-    df.to_csv(args.out_file, index=False)
-    print(f"Read {len(data)} rows")
+    num_rows = 0
+    writer = TableWriter(args.out_file, header, args.types, 
+                        args.date_fmt, args.decimal_scale)
+    try:
+        for p, rows in in_page_order(page_data):
+            t = time.perf_counter()
+            writer.write(rows, p)
+            timer.lap("write", t)
+            num_rows += len(rows)
+        t = time.perf_counter()
+    finally:
+        writer.close()
+    timer.lap("write", t)
+    print(f"Read {num_rows} rows")
     print(f"Saved to: {args.out_file}")
+    # Timings
+    report = timer.report(num_pages, num_rows, 
+                        time.perf_counter() - start_time)
+    report["file"] = file
+    print(f"Pages/s: {report['pages_per_s']:.1f}, Rows/s: "\
+            f"{report['rows_per_s']:.1f}, Stages (s): " + 
+            ", ".join(f"{k}: {v:.4f}" for k, v in timer.stages.items()))
+    if args.report_file is not None:
+        with open(args.report_file, "w") as f:
+            json.dump(report, f, indent=4)
+        print(f"Saved the report to: {args.report_file}")
+    if args.cache_dir is not None:
+        PageTextCache.evict(args.cache_dir, args.cache_max_mb * 2**20,
+                            keep=[cache_key])
 
 
 if __name__ == "__main__" and "ipykernel" not in sys.argv[0]:
     try:
         start_time = time.time()
         args = tyro.cli(Args, description=__doc__)
-        main(args)
+        if args.profile:
+            import cProfile, pstats
+            with cProfile.Profile() as prof:
+                main(args)
+            with open(args.profile_file, "w") as f:
+                pstats.Stats(prof, stream=f)\
+                        .sort_stats("cumulative").print_stats()
+            print(f"Saved the profile to: {args.profile_file}")
+        else:
+            main(args)
         end_time = time.time()
         print(f"Total time: {end_time - start_time:.4f}s")
     except SystemExit as exc:
@@ -0,0 +1,216 @@
+# Reads tables from many PDF files (see read_table_to_csv.py)
+"""
+    Converts all the PDF files in folders (or matching glob patterns)
+    using one pool of parallel jobs. The pages of all the files are
+    split into ranges and scheduled together, the largest files first
+    (so that the jobs stay busy till the end). The table options are
+    the same as read_table_to_csv.py (under `--table.`).
+
+    Output is either one CSV file per PDF file (in `out_dir`, named
+    like the PDF file), or one Parquet file with all the rows and a
+    `source_file` column. The rows of a file are in the order of its
+    pages (the rows of different files can be interleaved in the
+    Parquet file). The columns are typed with `--table.types`.
+
+    The rows, pages, and throughput (pages per second of the jobs
+    that read the file) are reported for every file.
+
+    Example calls:
+    ```bash
+    python ./read_tables_batch.py --inputs ./data/statements/ --out-dir ./data/csv/
+    python ./read_tables_batch.py --inputs "./data/2024-*.pdf" --out-format parquet --out-file ./data/2024.parquet --table.skip-last 1
+    ```
+"""
+
+# %%
+import os
+import sys
+import glob
+import tyro
+import time
+import traceback
+from tqdm.auto import tqdm
+from dataclasses import dataclass, field, replace
+from typing import Literal
+from joblib import Parallel, delayed
+from read_table_to_csv import Args, open_pdf, page_ranges, \
+        read_page_range, PageTextCache, TableWriter, page_table, \
+        arrow_type
+
+
+# %%
+@dataclass
+class LocalArgs:
+    # Folders (all the PDF files in them) or glob patterns or files
+    inputs: list[str]
+    # Output format (one CSV per file, or one Parquet for all files)
+    out_format: Literal["csv", "parquet"] = "csv"
+    # Output folder (for 'csv')
+    out_dir: str = "./out"
+    # Output file (for 'parquet')
+    out_file: str = "./tables.parquet"
+    # Number of parallel jobs (-1 = all cores)
+    jobs: int = -1
+    # Options for reading the tables (the file and jobs are ignored)
+    table: Args = field(default_factory=lambda: Args(file=""))
+
+
+# %%
+# All the PDF files (largest first)
+def find_pdf_files(inputs: list[str]) -> list[str]:
+    files = set()
+    for inp in inputs:
+        inp = os.path.expanduser(inp)
+        if os.path.isdir(inp):
+            inp = os.path.join(inp, "*.pdf")
+        files.update(os.path.realpath(f) for f in glob.glob(inp)
+                    if f.endswith(".pdf") and os.path.isfile(f))
+    return sorted(files, key=lambda f: (-os.path.getsize(f), f))
+
+
+# %%
+# Reads a page range of a file (the 'i'-th) and times it
+def read_file_range(i, file, start, end, args, cache_key):
+    t = time.perf_counter()
+    pages = read_page_range(file, start, end, args, cache_key)
+    return i, pages, time.perf_counter() - t
+
+
+# %%
+class CsvSink:
+    """
+        Writes the rows of every file to its own CSV file (in the
+        `out_dir`, with the headings).
+    """
+    def __init__(self, files: list[str], args: LocalArgs):
+        os.makedirs(args.out_dir, exist_ok=True)
+        self.paths = [os.path.join(args.out_dir,
+                    os.path.splitext(os.path.basename(f))[0] + ".csv")
+                    for f in files]
+        assert len(set(self.paths)) == len(self.paths), \
+                "PDF files should have different names"
+        self.table = args.table
+        self.open = {}  # File index: writer
+
+    def write(self, i: int, rows, page_no: int = None):
+        if i not in self.open:
+            self.open[i] = TableWriter(self.paths[i], 
+                    self.table.headings, self.table.types,
+                    self.table.date_fmt, self.table.decimal_scale)
+        self.open[i].write(rows, page_no)
+
+    def done(self, i: int):
+        if i not in self.open:  # No pages
+            self.write(i, [])
+        self.open.pop(i).close()
+        return self.paths[i]
+
+    def close(self):
+        for i in list(self.open):
+            self.done(i)
+
+
+# %%
+class ParquetSink:
+    """
+        Writes the rows of all the files to one Parquet file (the
+        headings and a `source_file` column; the columns are strings
+        if `--table.types` isn't given).
+    """
+    def __init__(self, files: list[str], args: LocalArgs):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self.pa, self.files, self.table = pa, files, args.table
+        self.types = args.table.types or \
+                    ["str"] * len(args.table.headings)
+        self.schema = pa.schema([(h, arrow_type(t, 
+                    args.table.decimal_scale)) for h, t in 
+                    zip(args.table.headings, self.types)] + 
+                    [("source_file", pa.string())])
+        self.writer = pq.ParquetWriter(args.out_file, self.schema)
+        self.out_file = args.out_file
+
+    def write(self, i: int, rows, page_no: int = None):
+        if not rows:
+            return
+        try:
+            table = page_table(rows, self.table.headings, self.types,
+                                self.table.date_fmt, 
+                                self.table.decimal_scale)
+        except Exception as exc:
+            raise ValueError(f"{self.files[i]}, page {page_no}: "\
+                                f"{exc}") from exc
+        table = table.append_column("source_file", 
+                self.pa.array([self.files[i]] * len(rows)))
+        self.writer.write_table(table.cast(self.schema))
+
+    def done(self, i: int):
+        return self.out_file
+
+    def close(self):
+        self.writer.close()
+
+
+# %%
+def main(args: LocalArgs):
+    print(f"Arguments: {args}")
+    files = find_pdf_files(args.inputs)
+    assert len(files) > 0, "No PDF files found"
+    print(f"Found {len(files)} PDF files")
+    # Page ranges of all the files (largest files first)
+    targs = replace(args.table, jobs=args.jobs)
+    keys, num_pages, tasks = [], [], []
+    for i, file in enumerate(files):
+        cache_key, n, _ = open_pdf(file, targs, verbose=False)
+        keys.append(cache_key)
+        num_pages.append(n)
+        tasks.extend((i, s, e) for s, e in page_ranges(n, targs))
+    print(f"Reading {sum(num_pages)} pages ({len(tasks)} ranges)")
+    # Read all the ranges (in any order) with one pool of jobs
+    res = Parallel(n_jobs=args.jobs, return_as="generator_unordered")(
+            delayed(read_file_range)(i, files[i], s, e, targs, keys[i])
+            for i, s, e in tasks)
+    sink = CsvSink(files, args) if args.out_format == "csv" \
+            else ParquetSink(files, args)
+    # Write the pages of every file in order (as they're ready)
+    pending = [{} for _ in files]   # Page: rows (that came early)
+    next_page = [0] * len(files)
+    num_rows, job_time = [0] * len(files), [0.0] * len(files)
+    start = time.perf_counter()
+    try:
+        for i, pages, t in tqdm(res, total=len(tasks)):
+            job_time[i] += t
+            pending[i].update(pages)
+            while next_page[i] in pending[i]:
+                rows = pending[i].pop(next_page[i])
+                sink.write(i, rows, next_page[i])
+                num_rows[i] += len(rows)
+                next_page[i] += 1
+            if next_page[i] == num_pages[i]:
+                out = sink.done(i)
+                tqdm.write(f"{files[i]}: {num_rows[i]} rows, "\
+                        f"{num_pages[i]} pages, "\
+                        f"{num_pages[i] / max(job_time[i], 1e-9):.1f}"\
+                        f" pages/s -> {out}")
+    finally:
+        sink.close()
+    total = time.perf_counter() - start
+    print(f"Read {sum(num_rows)} rows from {len(files)} files "\
+            f"({sum(num_pages) / total:.1f} pages/s)")
+    if args.table.cache_dir is not None:
+        PageTextCache.evict(args.table.cache_dir,
+                            args.table.cache_max_mb * 2**20, keep=keys)
+
+
+if __name__ == "__main__" and "ipykernel" not in sys.argv[0]:
+    try:
+        start_time = time.time()
+        args = tyro.cli(LocalArgs, description=__doc__)
+        main(args)
+        end_time = time.time()
+        print(f"Total time: {end_time - start_time:.4f}s")
+    except SystemExit as exc:
+        print(f"System Exit: {exc}")
+        exit(0)
+    except:
+        traceback.print_exc()
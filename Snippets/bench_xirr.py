@@ -0,0 +1,166 @@
+# Benchmark the XIRR calculation (see xirr_calc.py)
+"""
+    Compares the pure Python present value function (a loop over the
+    cash flows, solved using `scipy.optimize.fsolve`) with the NumPy
+    `XirrEngine` (Newton with analytic derivative) on synthetic cash
+    flows of different sizes.
+
+    The synthetic cash flows are deposits (+ve) at random times over
+    `num_years` years and a single withdrawal (-ve) at the end, such
+    that the IRR is `true_irr`.
+    
+    The `startup` mode measures the cold-start time of the CLI (a
+    3-value XIRR in a new interpreter, with years and with non-ISO
+    dates) and of importing the module.
+    The results can be appended to a CSV file (to track them).
+
+    Example calls:
+    ```bash
+    python ./bench_xirr.py
+    python ./bench_xirr.py --sizes 10 10000 --repeats 10
+    python ./bench_xirr.py --mode startup --repeats 10 --log-file ./startup.csv
+    ```
+"""
+
+# %%
+import os
+import sys
+import tyro
+import time
+import subprocess
+import numpy as np
+import scipy.optimize
+from datetime import datetime
+from typing import Literal, Optional
+from dataclasses import dataclass, field
+from xirr_calc import XirrEngine, year_value_loop_func_generator
+
+
+# %%
+@dataclass
+class LocalArgs:
+    # Benchmark the solvers or the startup (cold-start) time
+    mode: Literal["solve", "startup"] = "solve"
+    # Number of cash flows to benchmark
+    sizes: list[int] = field(default_factory=lambda:
+                            [10, 10_000, 1_000_000])
+    # Number of repeats (best time is reported)
+    repeats: int = 5
+    # Max size for solving using the pure Python function (slow)
+    loop_solve_max: int = 100_000
+    # Duration of the synthetic cash flows (in years)
+    num_years: float = 30.0
+    # IRR (in %) of the synthetic cash flows
+    true_irr: float = 8.0
+    # Seed for the random number generator
+    seed: int = 0
+    # CSV file to append the startup times to (for 'startup' mode)
+    log_file: Optional[str] = None
+
+
+# %%
+def synthetic_cashflows(n, num_years, irr, seed=0):
+    """
+        Returns (values, years) of `n` cash flows (as lists) with the
+        given IRR (fraction). The last value balances the rest.
+    """
+    rng = np.random.default_rng(seed)
+    years = np.sort(rng.uniform(0, num_years, n))
+    years[-1] = num_years
+    vals = rng.uniform(100, 10_000, n)
+    vals[-1] = 0
+    vals[-1] = -(vals * (1 + irr) ** (num_years - years)).sum()
+    return vals.tolist(), years.tolist()
+
+
+# %%
+def best_time(func, repeats):
+    best, res = float("inf"), None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        res = func()
+        best = min(best, time.perf_counter() - start)
+    return best, res
+
+
+# %%
+def startup_times(cmd, repeats):
+    """
+        Wall times (in seconds) of running `cmd` (a new interpreter)
+        `repeats` times.
+    """
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, 
+                        cwd=os.path.dirname(os.path.abspath(__file__)))
+        times.append(time.perf_counter() - start)
+    return np.array(times)
+
+
+# %%
+def bench_startup(args: LocalArgs):
+    cmds = {
+        "python": [sys.executable, "-c", "pass"],
+        "import": [sys.executable, "-c", "import xirr_calc"],
+        "cli": [sys.executable, "./xirr_calc.py", "--values", "1000", 
+                "1000", "-2200", "--years", "2000", "2001", "2006"],
+        "cli-dates": [sys.executable, "./xirr_calc.py", "--date-fmt", 
+                "%d-%m-%Y", "--values", "1000", "1000", "-2500", 
+                "--dates", "1-1-2000", "1-1-2001", "1-2-2004"],
+    }
+    print(f"{'Command':>9s} {'Min (ms)':>10s} {'Mean (ms)':>10s} "\
+            f"{'Max (ms)':>10s}")
+    res = {}
+    for name, cmd in cmds.items():
+        t = startup_times(cmd, args.repeats) * 1e3
+        res[name] = t
+        print(f"{name:>9s} {t.min():>10.2f} {t.mean():>10.2f} "\
+                f"{t.max():>10.2f}")
+    if args.log_file is not None:
+        new_file = not os.path.isfile(args.log_file)
+        with open(args.log_file, "a") as f:
+            if new_file:
+                f.write("timestamp,command,repeats,min_ms,mean_ms\n")
+            ts = datetime.now().isoformat(timespec="seconds")
+            for name, t in res.items():
+                f.write(f"{ts},{name},{len(t)},{t.min():.3f},"\
+                        f"{t.mean():.3f}\n")
+        print(f"Appended to: {args.log_file}")
+
+
+# %%
+def main(args: LocalArgs):
+    print(f"Arguments: {args}")
+    if args.mode == "startup":
+        bench_startup(args)
+        return
+    print(f"{'Size':>10s} {'Method':>8s} {'PV (ms)':>12s} "\
+            f"{'Solve (ms)':>12s} {'IRR (%)':>10s}")
+    for n in args.sizes:
+        vals, years = synthetic_cashflows(n, args.num_years,
+                                        args.true_irr / 100, args.seed)
+        x = args.true_irr / 200
+        # Pure Python loop (and fsolve)
+        loop_func = year_value_loop_func_generator(vals, years)
+        t_pv, _ = best_time(lambda: loop_func(x), args.repeats)
+        t_sol, irr = float("nan"), float("nan")
+        if n <= args.loop_solve_max:
+            t_sol, irr = best_time(lambda:
+                    scipy.optimize.fsolve(loop_func, 0.1)[0],
+                    args.repeats)
+        print(f"{n:>10d} {'loop':>8s} {t_pv * 1e3:>12.4f} "\
+                f"{t_sol * 1e3:>12.4f} {irr * 100:>10.4f}")
+        # NumPy engine (including the array conversion)
+        t_pv, _ = best_time(lambda: XirrEngine(vals, years).npv(x),
+                            args.repeats)
+        t_sol, res = best_time(lambda:
+                XirrEngine(vals, years).solve(0.1), args.repeats)
+        print(f"{n:>10d} {'numpy':>8s} {t_pv * 1e3:>12.4f} "\
+                f"{t_sol * 1e3:>12.4f} {res.irr * 100:>10.4f}")
+
+
+if __name__ == "__main__" and "ipykernel" not in sys.argv[0]:
+    args = tyro.cli(LocalArgs, description=__doc__)
+    main(args)
+    exit(0)
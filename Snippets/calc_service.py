@@ -0,0 +1,234 @@
+# Long-running XIRR and EMI calculation service (JSON lines)
+"""
+    Loads once and answers requests (one JSON object per line) from
+    stdin (results to stdout) or from a local Unix socket. Requests
+    that arrive together are handled as a batch: all the `xirr`
+    requests are solved together (see `batch_xirr` in xirr_calc.py,
+    which also uses parallel jobs for large batches) and the EMIs are
+    calculated on arrays.
+
+    Requests (`id` is optional and is returned as is):
+    - `{"id": 1, "op": "xirr", "values": [...], "dates": [...],
+        "date_fmt": "%Y-%m-%d"}`: Use `years` instead of `dates`
+        (or neither, like xirr_calc.py).
+    - `{"id": 2, "op": "present", "values": [...], "years": [...],
+        "irr": 6}`: Present value (at the last year) with the IRR
+        in %.
+    - `{"id": 3, "op": "emi", "loan_amount": 1e7,
+        "yearly_interest": 0.085, "loan_tenure_years": 5,
+        "schedule": false}`: The EMI (interest as a fraction). If
+        `schedule` is true, the amortization schedule is also given
+        (as columns, see `schedule_dtype` in emi_calculator.py).
+
+    Responses are `{"id": ..., "ok": true, "result": {...}}` or
+    `{"id": ..., "ok": false, "error": "..."}` (one line each, in the
+    order of the requests in a batch).
+
+    Example calls:
+    ```bash
+    echo '{"id": 1, "op": "xirr", "values": [1000, 1000, -2200], "years": [2000, 2001, 2006]}' | python ./calc_service.py
+    python ./calc_service.py --socket /tmp/calc.sock
+    echo '{"op": "emi", "loan_amount": 1e5, "yearly_interest": 0.1, "loan_tenure_years": 1}' | nc -U -q 1 /tmp/calc.sock
+    ```
+"""
+
+# %%
+import os
+import sys
+import json
+import math
+import tyro
+import select
+import socketserver
+import numpy as np
+from typing import Optional
+from dataclasses import dataclass
+from emi_calculator import get_emi, amortization_schedule
+from xirr_calc import XirrEngine, dates_to_years, batch_xirr
+
+
+# %%
+@dataclass
+class LocalArgs:
+    # Unix socket to listen on (None = read stdin, write stdout)
+    socket: Optional[str] = None
+    # Max number of requests in a batch
+    max_batch: int = 10_000
+    # Time (in seconds) to wait for more requests to fill a batch
+    batch_wait: float = 0.002
+    # Number of parallel jobs (for large xirr batches; -1 = all cores)
+    jobs: int = -1
+    # Minimum number of xirr requests to use parallel jobs
+    parallel_min_groups: int = 10_000
+
+
+# %%
+def read_batches(fd: int, max_batch: int = 10_000,
+            batch_wait: float = 0.002):
+    """
+        Yields batches (lists) of lines read from the file descriptor
+        `fd` (stdin or a socket). A batch has all the lines that are
+        available (waiting up to `batch_wait` seconds for more), up to
+        `max_batch` lines. Stops at the end of the input.
+    """
+    buf, lines, eof = b"", [], False
+    while not eof:
+        chunk = os.read(fd, 1 << 16)    # Blocks for the first data
+        while chunk:
+            buf += chunk
+            *new_lines, buf = buf.split(b"\n")
+            lines.extend(new_lines)
+            if len(lines) >= max_batch or \
+                    not select.select([fd], [], [], batch_wait)[0]:
+                break
+            chunk = os.read(fd, 1 << 16)
+        if not chunk:
+            eof = True
+            lines.append(buf)
+        lines = [line for line in lines if line.strip()]
+        while lines:
+            yield lines[:max_batch]
+            lines = lines[max_batch:]
+
+
+# %%
+# Floats as JSON (NaN and infinity are not valid JSON)
+def _num(x):
+    x = float(x)
+    return x if math.isfinite(x) else None
+
+
+# %%
+# Values and years as float arrays (raises for bad values)
+def _cashflows(req):
+    values = np.asarray(req["values"], dtype=np.float64)
+    if "dates" in req:
+        years = dates_to_years(req["dates"],
+                                req.get("date_fmt", r"%Y-%m-%d"))
+    else:
+        years = req.get("years", np.arange(len(values)))
+    years = np.asarray(years, dtype=np.float64)
+    assert values.ndim == 1 and values.shape == years.shape and \
+            len(values) > 0, \
+            "Need (non-empty) values and years of the same length"
+    return values, years
+
+
+# %%
+def _error(req_id, exc):
+    return {"id": req_id, "ok": False,
+            "error": f"{type(exc).__name__}: {exc}"}
+
+
+# %%
+def handle_batch(lines, jobs: int = -1,
+            parallel_min_groups: int = 10_000):
+    """
+        Handles a batch of requests (JSON lines) and returns the
+        responses (dicts, in the same order). A request that fails
+        (or a batched stage that fails for all its requests) gets an
+        error response; the others are still answered.
+    """
+    resps = [None] * len(lines)
+    xirr_reqs = []  # (index, values, years)
+    emi_reqs = []   # (index, request, loan)
+    for i, line in enumerate(lines):
+        req_id = None
+        try:
+            req = json.loads(line)
+            req_id = req.get("id")
+            resps[i] = {"id": req_id, "ok": True}
+            op = req.get("op")
+            if op == "xirr":
+                xirr_reqs.append((i, *_cashflows(req)))
+            elif op == "present":
+                values, years = _cashflows(req)
+                pv = XirrEngine(values, years).npv(req["irr"] / 100)
+                resps[i]["result"] = {"present_value": _num(pv)}
+            elif op == "emi":
+                loan = [float(req[k]) for k in ("loan_amount",
+                        "yearly_interest", "loan_tenure_years")]
+                emi_reqs.append((i, req, loan))
+            else:
+                raise ValueError(f"Unknown {op = }")
+        except Exception as exc:
+            resps[i] = _error(req_id, exc)
+    # All XIRRs together (as one batch of portfolios)
+    if xirr_reqs:
+        try:
+            ids = np.repeat([i for i, _, _ in xirr_reqs],
+                            [len(v) for _, v, _ in xirr_reqs])
+            years = np.concatenate([y for _, _, y in xirr_reqs])
+            vals = np.concatenate([v for _, v, _ in xirr_reqs])
+            res = batch_xirr(ids, years, vals, jobs,
+                            parallel_min_groups)
+            for i, irr, n_iter, status in res.itertuples(index=False):
+                resps[i]["result"] = {"irr_pct": _num(irr),
+                        "num_iter": int(n_iter), "status": status}
+        except Exception as exc:
+            for i, _, _ in xirr_reqs:
+                resps[i] = _error(resps[i]["id"], exc)
+    # All EMIs together (as arrays)
+    if emi_reqs:
+        try:
+            loans = np.array([loan for _, _, loan in emi_reqs],
+                            dtype=np.float64)
+            emis = get_emi(loans[:, 0], loans[:, 1], loans[:, 2])
+        except Exception as exc:
+            for i, _, _ in emi_reqs:
+                resps[i] = _error(resps[i]["id"], exc)
+            emi_reqs, emis = [], []
+        for (i, req, loan), emi in zip(emi_reqs, emis):
+            try:
+                result = {"emi": _num(emi)}
+                if req.get("schedule", False):
+                    sched = amortization_schedule(*loan)
+                    result["schedule"] = {name: sched[name].tolist()
+                            for name in sched.dtype.names}
+                resps[i]["result"] = result
+            except Exception as exc:
+                resps[i] = _error(resps[i]["id"], exc)
+    return resps
+
+
+# %%
+def serve(fd_in: int, write, args: LocalArgs):
+    """
+        Reads requests from `fd_in` and writes the responses (bytes)
+        using `write`, batch by batch.
+    """
+    for lines in read_batches(fd_in, args.max_batch, args.batch_wait):
+        resps = handle_batch(lines, args.jobs,
+                            args.parallel_min_groups)
+        write("".join(json.dumps(r) + "\n" for r in resps).encode())
+
+
+# %%
+def main(args: LocalArgs):
+    if args.socket is None:
+        def write(data):
+            sys.stdout.buffer.write(data)
+            sys.stdout.buffer.flush()
+        serve(sys.stdin.fileno(), write, args)
+        return
+    # One thread per connection
+    class Handler(socketserver.BaseRequestHandler):
+        def handle(self):
+            serve(self.request.fileno(), self.request.sendall, args)
+    if os.path.exists(args.socket):
+        os.remove(args.socket)
+    with socketserver.ThreadingUnixStreamServer(args.socket,
+                                                Handler) as server:
+        print(f"Listening on: {args.socket}", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.remove(args.socket)
+
+
+if __name__ == "__main__" and "ipykernel" not in sys.argv[0]:
+    args = tyro.cli(LocalArgs, description=__doc__)
+    main(args)
+    exit(0)
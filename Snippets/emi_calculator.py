@@ -1,60 +1,379 @@
 # Calculate the EMI payments on a debt
 """
+    Calculates the EMI (equated monthly installment) of a loan and
+    the amortization schedule (interest and principal parts of every
+    payment, and the principal left after it).
+    
+    Example calls:
+    ```bash
+    python ./emi_calculator.py
+    python ./emi_calculator.py --loan-amount 5e6 --yearly-interest 9 --loan-tenure-years 20
+    # Schedule to a file (streamed in blocks) or only the totals
+    python ./emi_calculator.py --loan-tenure-years 40 --out-file ./schedule.parquet
+    python ./emi_calculator.py --loan-tenure-years 40 --summary-only
+    # EMIs of all loans in a loan book (CSV, Parquet, or NPY)
+    python ./emi_calculator.py --mode book --book-file ./loans.parquet --out-file ./loans_emi.csv
+    ```
+    
     Reference
     - https://emicalculator.net/
 """
 
 # %%
-loan_amount = 1e7
-yearly_interest = 8.5/100
-loan_tenure_years = 5
+import os
+import sys
+import tyro
+import numpy as np
+from dataclasses import dataclass
+from typing import Literal, Optional
+
+
+# %%
+@dataclass
+class LocalArgs:
+    # Loan amount (principal)
+    loan_amount: float = 1e7
+    # Yearly interest rate (in %)
+    yearly_interest: float = 8.5
+    # Loan tenure (in years)
+    loan_tenure_years: int = 5
+    # Mode of functioning
+    mode: Literal["loan", "book"] = "loan"
+    """
+        Program has two modes of functioning:
+        1. `loan`: Schedule of a single loan (using `loan_amount`, 
+                `yearly_interest`, and `loan_tenure_years`). It is
+                printed, or saved to `out_file` (if given).
+        2. `book`: EMI, total interest, and payoff month of every 
+                loan in the `book_file` (see `book_columns`). The 
+                results are saved to `out_file`.
+    """
+    # Loan book file (for 'book' mode; CSV, Parquet, or NPY)
+    book_file: Optional[str] = None
+    """
+        CSV and Parquet files should have the `book_columns` (the 
+        interest in %, and optionally a 'start_date' column). NPY files
+        should have the columns (in that order) in a 2D array, or a
+        structured array with the fields.
+    """
+    # Output file
+    out_file: Optional[str] = None
+    """
+        For `loan` mode: the schedule is saved here (CSV, Parquet, or
+        '.bin', see `write_schedule`) instead of printing it. For 
+        `book` mode: CSV or Parquet (default is './loans_emi.csv').
+    """
+    # Loans per chunk (for 'book' mode; memory stays bounded)
+    chunk_size: int = 1_000_000
+    # Rows per block of the schedule (for 'loan' mode)
+    block_size: int = 65_536
+    # Only the totals of the schedule (no rows; for 'loan' mode)
+    summary_only: bool = False
+
 
 # %%
 def get_emi(loan_amount, yearly_interest, loan_tenure_years):
-    r = (1 + (yearly_interest / 12))
-    p = loan_amount
-    n = loan_tenure_years * 12
-    emi = (p * r ** n * (r - 1)) / (r ** n - 1)
-    return emi
-
-
-# %%
-# Loan specifications
-num_payments = loan_tenure_years * 12
-monthly_interest = yearly_interest / 12
-# Payment process
-emi = get_emi(loan_amount, yearly_interest, loan_tenure_years)
-principal_paid = 0
-interest_paid = 0
-left_amount = loan_amount
-all_payments = []   # (yr, mo, int_part, p_paid, emi, p_left)
-for i in range(num_payments):
-    interest = left_amount * monthly_interest
-    principal_amount = emi - interest
-    principal_left = left_amount - principal_amount
-    all_payments.append((i // 12, i % 12, interest, 
-                    principal_amount,principal_left))
-    left_amount = principal_left
-    interest_paid += interest
-    principal_paid += principal_amount
-
-
-# %%
-print(f"{'SNo':>5s} {'Yr':>3s} {'Mo':>3s} {'Int':>10s} "\
-        f"{'Pr':>10s} {'T Paid':>12s} {'Left':>12s}")
-tp = 0
-i = 0
-for y, m, int_part, p_paid, p_left in all_payments:
-    tp += emi
-    i += 1
-    print(f"{i:>4d}> {y:>3d} {m:>3d} " \
-            f"{int_part:>10.2f} {p_paid:>10.2f} "\
-            f"{tp:>12.2f} {p_left:>12.2f}")
-
-print(f"Loan Amount: {loan_amount:.2f}")
-print(f"Yearly interest: {yearly_interest*100:.2f}%")
-print(f"Loan Tenure: {loan_tenure_years} years")
-print(f"Monthly EMI: {emi:.2f}")
-print(f"Total Interest Paid: {interest_paid:.2f}")
+    """
+        EMI of the loan(s). Scalars or arrays (broadcast) can be given
+        (the interest is a fraction). Uses the stable form
+        `p * i / (1 - (1 + i) ** -n)` (`i` is the monthly interest). 
+        For zero interest, the EMI is `p / n`. The tenure is rounded
+        to a whole number of months `n` (like the schedule).
+    """
+    i = np.asarray(yearly_interest, dtype=np.float64) / 12
+    p = np.asarray(loan_amount, dtype=np.float64)
+    n = np.rint(np.asarray(loan_tenure_years, dtype=np.float64) * 12)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        emi = p * i / -np.expm1(-n * np.log1p(i))
+    emi = np.where(i == 0, p / n, emi)
+    return emi[()] if emi.ndim == 0 else emi
+
+
+# %%
+# Fields of a row in the amortization schedule
+schedule_dtype = np.dtype([
+    ("yr", np.int64),           # Year (from 0)
+    ("mo", np.int64),           # Month of the year (from 0)
+    ("interest", np.float64),   # Interest part of the EMI
+    ("principal", np.float64),  # Principal part of the EMI
+    ("paid", np.float64),       # Total paid (so far)
+    ("left", np.float64),       # Principal left (after payment)
+])
+
+
+# %%
+def amortization_schedule(loan_amount, yearly_interest, 
+            loan_tenure_years) -> np.ndarray:
+    """
+        Amortization schedule of the loan (monthly payments). All the
+        payments are calculated at once using the closed form of the
+        principal left after `k` payments (over `n` payments in all)
+        `p * (r ** n - r ** k) / (r ** n - 1)` (`r` is one plus the
+        monthly interest rate), or `p * (1 - k / n)` for zero 
+        interest.
+        Parameters:
+        - loan_amount: float        Loan amount (principal)
+        - yearly_interest: float    Yearly interest rate (fraction)
+        - loan_tenure_years: int    Loan tenure (in years)
+        
+        Returns a structured array (of `schedule_dtype`) with a row 
+        for each payment. Use `pd.DataFrame(...)` for a DataFrame.
+    """
+    num_payments = int(round(loan_tenure_years * 12))
+    return _schedule_block(loan_amount, yearly_interest, 
+                            loan_tenure_years, 0, num_payments)
+
+
+# %%
+# Rows `k_start` to `k_end` (excluding) of the schedule (closed form)
+def _schedule_block(loan_amount, yearly_interest, loan_tenure_years,
+            k_start, k_end) -> np.ndarray:
+    num_payments = int(round(loan_tenure_years * 12))
+    monthly_interest = yearly_interest / 12
+    emi = get_emi(loan_amount, yearly_interest, num_payments / 12)
+    k = np.arange(k_start, k_end + 1)
+    if monthly_interest == 0:
+        left = loan_amount * (1 - k / num_payments)
+    else:   # Same as above (but stable for small interest)
+        lr = np.log1p(monthly_interest)
+        left = loan_amount * np.expm1((k - num_payments) * lr) / \
+                np.expm1(-num_payments * lr)   # After k payments
+        left[k == num_payments] = 0.0  # Paid off (not -0.0)
+    sched = np.empty(k_end - k_start, dtype=schedule_dtype)
+    sched["yr"], sched["mo"] = np.divmod(k[:-1], 12)
+    sched["interest"] = left[:-1] * monthly_interest
+    sched["principal"] = emi - sched["interest"]
+    sched["paid"] = emi * k[1:]
+    sched["left"] = left[1:]
+    return sched
+
+
+# %%
+def iter_schedule(loan_amount, yearly_interest, loan_tenure_years, 
+            block_size: int = 65_536):
+    """
+        Same as `amortization_schedule`, but yields the schedule 
+        lazily in blocks (structured arrays) of `block_size` rows. 
+        Only one block is in memory at a time.
+    """
+    num_payments = int(round(loan_tenure_years * 12))
+    for k in range(0, num_payments, block_size):
+        yield _schedule_block(loan_amount, yearly_interest, 
+                loan_tenure_years, k, min(k + block_size, 
+                                            num_payments))
+
+
+# %%
+def schedule_summary(loan_amount, yearly_interest, 
+            loan_tenure_years) -> dict:
+    """
+        Totals of the schedule (without calculating any rows).
+    """
+    num_payments = int(round(loan_tenure_years * 12))
+    emi = float(get_emi(loan_amount, yearly_interest, 
+                        loan_tenure_years))
+    return {"emi": emi, "num_payments": num_payments, 
+            "total_paid": emi * num_payments, 
+            "total_interest": emi * num_payments - loan_amount}
+
+
+# %%
+def write_schedule(blocks, out_file: str) -> int:
+    """
+        Writes the schedule `blocks` (from `iter_schedule`) to 
+        `out_file` as they come (buffered, block by block). The format
+        is based on the extension: '.parquet' (needs pyarrow), '.bin'
+        (raw `schedule_dtype` records, read using `np.fromfile`), or 
+        CSV (anything else). Returns the number of rows written.
+    """
+    num_rows, writer = 0, None
+    header = ",".join(schedule_dtype.names)
+    fmt = "%d,%d,%.6f,%.6f,%.6f,%.6f"
+    with open(out_file, "wb") as f:
+        if not out_file.endswith((".parquet", ".bin")):
+            f.write(f"{header}\n".encode())
+        for block in blocks:
+            if out_file.endswith(".parquet"):
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+                table = pa.table({n: block[n] 
+                                    for n in block.dtype.names})
+                if writer is None:
+                    writer = pq.ParquetWriter(f, table.schema)
+                writer.write_table(table)
+            elif out_file.endswith(".bin"):
+                block.tofile(f)
+            else:
+                np.savetxt(f, block.tolist(), fmt=fmt)
+            num_rows += len(block)
+        if writer is not None:
+            writer.close()
+    return num_rows
+
+
+# %%
+def print_schedule(blocks):
+    """
+        Prints the schedule `blocks` (a block of rows per write).
+    """
+    print(f"{'SNo':>5s} {'Yr':>3s} {'Mo':>3s} {'Int':>10s} "\
+            f"{'Pr':>10s} {'T Paid':>12s} {'Left':>12s}")
+    fmt = "%4d> %3d %3d %10.2f %10.2f %12.2f %12.2f\n"
+    i = 0
+    for block in blocks:
+        rows = zip(range(i + 1, i + len(block) + 1), 
+                *(block[n].tolist() for n in ("yr", "mo", "interest", 
+                    "principal", "paid", "left")))
+        sys.stdout.write("".join(fmt % row for row in rows))
+        i += len(block)
+    sys.stdout.flush()
+
+
+# %%
+# Columns of a loan book (interest in %; 'start_date' is optional)
+book_columns = ["loan_amount", "yearly_interest", "loan_tenure_years"]
+
+
+# %%
+def price_loans(loan_amount, yearly_interest, loan_tenure_years, 
+            start_date=None) -> dict:
+    """
+        EMI, total interest, and payoff month of many loans at once
+        (broadcasting over the arrays).
+        Parameters:
+        - loan_amount: array-like       Loan amounts
+        - yearly_interest: array-like   Yearly interest (fractions)
+        - loan_tenure_years: array-like Loan tenures (in years)
+        - start_date: array-like        Start dates of the loans (the 
+                                        first EMI is a month later). 
+                                        If None, there's no payoff.
+        
+        Returns a dict of arrays: "emi", "total_interest", and
+        "payoff_month" (datetime64[M], only if `start_date` is given).
+    """
+    p = np.asarray(loan_amount, dtype=np.float64)
+    n = np.rint(np.asarray(loan_tenure_years, dtype=np.float64) * 12)
+    emi = get_emi(p, yearly_interest, loan_tenure_years)
+    res = {"emi": emi, "total_interest": emi * n - p}
+    if start_date is not None:
+        start = np.asarray(start_date, dtype="datetime64[M]")
+        res["payoff_month"] = start + n.astype(np.int64)
+    return res
+
+
+# %%
+def read_loan_book(file: str, chunk_size: int = 1_000_000):
+    """
+        Yields the loan book (see `book_columns`) in chunks of (at 
+        most) `chunk_size` loans, as DataFrames. CSV and Parquet files
+        are read in chunks (other columns, like IDs, are kept), NPY 
+        files are memory-mapped.
+    """
+    import pandas as pd
+    if file.endswith(".npy"):
+        arr = np.load(file, mmap_mode="r")
+        for i in range(0, len(arr), chunk_size):
+            chunk = np.asarray(arr[i:i + chunk_size])
+            if chunk.dtype.names is not None:
+                yield pd.DataFrame({c: chunk[c] for c in 
+                                    chunk.dtype.names})
+            else:
+                yield pd.DataFrame(chunk[:, :3], columns=book_columns)
+    elif file.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        pf = pq.ParquetFile(file)
+        for batch in pf.iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(file, chunksize=chunk_size)
+
+
+# %%
+def price_loan_book(file: str, out_file: str, 
+            chunk_size: int = 1_000_000) -> dict:
+    """
+        Prices the loan book in `file` chunk by chunk (see
+        `read_loan_book` and `price_loans`), writing the results
+        (the loan book columns and the results) to `out_file` (CSV or
+        Parquet) as they're ready. Returns the totals over the book.
+    """
+    writer = None
+    totals = {"loans": 0, "principal": 0.0, "emi": 0.0, 
+                "total_interest": 0.0}
+    try:
+        for i, df in enumerate(read_loan_book(file, chunk_size)):
+            res = price_loans(df["loan_amount"].to_numpy(), 
+                    df["yearly_interest"].to_numpy() / 100, 
+                    df["loan_tenure_years"].to_numpy(), 
+                    df["start_date"].to_numpy(dtype="datetime64[D]")
+                    if "start_date" in df else None)
+            for k, v in res.items():
+                df[k] = v.astype(str) if k == "payoff_month" else v
+            totals["loans"] += len(df)
+            totals["principal"] += float(df["loan_amount"].sum())
+            totals["emi"] += float(np.nansum(res["emi"]))
+            totals["total_interest"] += float(np.nansum(
+                                            res["total_interest"]))
+            if out_file.endswith(".parquet"):
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(out_file, table.schema)
+                writer.write_table(table)
+            else:
+                df.to_csv(out_file, mode="w" if i == 0 else "a", 
+                            header=(i == 0), index=False)
+    finally:
+        if writer is not None:
+            writer.close()
+    return totals
+
+
+# %%
+def main(args: LocalArgs):
+    if args.mode == "book":
+        assert args.book_file is not None and \
+                os.path.isfile(args.book_file), "Need a loan book file"
+        if args.out_file is None:
+            args.out_file = "./loans_emi.csv"
+        totals = price_loan_book(args.book_file, args.out_file, 
+                                args.chunk_size)
+        print(f"Loans: {totals['loans']}")
+        print(f"Total principal: {totals['principal']:.2f}")
+        print(f"Total monthly EMI: {totals['emi']:.2f}")
+        print(f"Total interest: {totals['total_interest']:.2f}")
+        print(f"Saved to: {args.out_file}")
+        return
+    loan_amount = args.loan_amount
+    yearly_interest = args.yearly_interest / 100
+    loan_tenure_years = args.loan_tenure_years
+    summary = schedule_summary(loan_amount, yearly_interest, 
+                                loan_tenure_years)
+    emi, interest_paid = summary["emi"], summary["total_interest"]
+    if not args.summary_only:
+        blocks = iter_schedule(loan_amount, yearly_interest, 
+                                loan_tenure_years, args.block_size)
+        if args.out_file is None:
+            print_schedule(blocks)
+        else:
+            num_rows = write_schedule(blocks, args.out_file)
+            print(f"Saved {num_rows} rows to: {args.out_file}")
+    
+    print(f"Loan Amount: {loan_amount:.2f}")
+    print(f"Yearly interest: {yearly_interest*100:.2f}%")
+    print(f"Loan Tenure: {loan_tenure_years} years")
+    print(f"Monthly EMI: {emi:.2f}")
+    print(f"Total Interest Paid: {interest_paid:.2f}")
+
+
+if __name__ == "__main__" and "ipykernel" not in sys.argv[0]:
+    args = tyro.cli(LocalArgs, description=__doc__)
+    main(args)
+    exit(0)
+
+
+# %%
+# Experimental section
 
 # %%
@@ -0,0 +1,239 @@
+# What-if scenarios (prepayments, rate changes) for loans
+"""
+    Compares scenarios of a loan (see emi_calculator.py) with events
+    like part-prepayments and (floating) interest rate resets. After
+    each event, either the EMI is reduced (tenure is kept) or the
+    tenure is reduced (EMI is kept).
+
+    The schedule is not stepped month by month. Between two events,
+    the EMI and rate are fixed, so the principal left after `k`
+    payments has a closed form `b * r ** k - e * (r ** k - 1) / i`
+    (`b` is the principal at the start, `e` is the EMI, `i` is the
+    monthly interest, and `r = 1 + i`). The interest paid is
+    `e * k - (b - b_k)`. So each scenario costs one step per event.
+    Loans are evaluated using parallel jobs (for many loans).
+
+    The scenario file is a JSON list of loans like
+    ```json
+    [{"id": "home", "loan_amount": 5e6, "yearly_interest": 8.5,
+        "loan_tenure_years": 20, "scenarios": {
+            "prepay": [{"month": 12, "kind": "prepay",
+                "amount": 2e5, "adjust": "tenure"}],
+            "hike": [{"month": 6, "kind": "rate", "rate": 9.5,
+                "adjust": "emi"}]}}]
+    ```
+    Interest rates are in %. The `month` of an event is the number of
+    EMIs paid before it. A 'baseline' (no events) scenario is always
+    evaluated (for the comparison).
+
+    Output is a CSV file with the total interest, interest saved,
+    tenure (months), tenure change, and last EMI of every scenario.
+    Scenarios that fail (bad loan or events) have empty results and 
+    the error in the status.
+
+    Example calls:
+    ```bash
+    python ./loan_scenarios.py --scenario-file ./scenarios.json --out-file ./loan_scenarios.csv
+    ```
+"""
+
+# %%
+import os
+import sys
+import json
+import math
+import tyro
+from typing import Literal, Optional
+from dataclasses import dataclass
+from emi_calculator import get_emi
+
+
+# %%
+@dataclass
+class LocalArgs:
+    # Scenario file (JSON, see the description)
+    scenario_file: str
+    # Output file (CSV)
+    out_file: str = "./loan_scenarios.csv"
+    # Number of parallel jobs (-1 = all cores)
+    jobs: int = -1
+    # Minimum number of loans to use parallel jobs
+    parallel_min_loans: int = 1000
+
+
+# %%
+@dataclass
+class LoanEvent:
+    # Number of EMIs paid before the event
+    month: int
+    # Kind of event (a part-prepayment or a new interest rate)
+    kind: Literal["prepay", "rate"]
+    # After the event, reduce the EMI or the tenure (keep the other)
+    adjust: Literal["emi", "tenure"] = "tenure"
+    # Amount prepaid (for 'prepay')
+    amount: float = 0.0
+    # New yearly interest rate in % (for 'rate')
+    rate: Optional[float] = None
+
+    def __post_init__(self):
+        if self.kind not in ("prepay", "rate"):
+            raise ValueError(f"Unknown event: {self.kind = }")
+        if self.adjust not in ("emi", "tenure"):
+            raise ValueError(f"Unknown adjust: {self.adjust = }")
+        if self.month < 0:
+            raise ValueError(f"Negative month: {self.month = }")
+        if self.kind == "prepay" and not self.amount > 0:
+            raise ValueError(f"Prepay needs an amount > 0: "\
+                    f"{self.amount = }")
+        if self.kind == "rate" and (self.rate is None or 
+                                    not self.rate >= 0):
+            raise ValueError(f"Rate event needs a rate >= 0: "\
+                    f"{self.rate = }")
+
+    @classmethod
+    def from_dict(cls, ev: dict) -> "LoanEvent":
+        try:
+            return cls(**ev)
+        except TypeError as exc:    # Unknown or missing keys
+            raise ValueError(f"Bad event {ev}: {exc}") from exc
+
+
+# %%
+# Principal left and interest paid after `k` EMIs (closed form)
+def advance(b, i, e, k):
+    if i == 0:
+        b_k = b - e * k
+    else:
+        g = (1 + i) ** k
+        b_k = b * g - e * (g - 1) / i
+    return b_k, e * k - (b - b_k)
+
+
+# %%
+# Number of EMIs to pay off `b` (can be fractional; last is partial)
+def num_payments(b, i, e):
+    if b <= 0:
+        return 0.0
+    if i == 0:
+        return b / e
+    if e <= b * i:
+        raise ValueError(f"EMI {e:.2f} doesn't cover the interest "\
+                f"{b * i:.2f}, the loan is never paid off")
+    return -math.log1p(-b * i / e) / math.log1p(i)
+
+
+# %%
+def simulate(loan_amount: float, yearly_interest: float,
+            loan_tenure_years: float, events: list[LoanEvent]):
+    """
+        Simulates the loan with the events (piecewise closed form,
+        see `advance`).
+        Parameters:
+        - loan_amount: float        Loan amount (principal)
+        - yearly_interest: float    Yearly interest (in %)
+        - loan_tenure_years: float  Loan tenure (in years)
+        - events: list[LoanEvent]   Events (in any order)
+
+        Returns a dict with the "total_interest", "tenure_months"
+        (number of EMIs), and "last_emi" (EMI after the last event).
+    """
+    b, i = float(loan_amount), yearly_interest / 1200
+    e = float(get_emi(b, yearly_interest / 100, loan_tenure_years))
+    month, interest = 0, 0.0
+    for ev in sorted(events, key=lambda ev: ev.month):
+        # Pay the EMIs till the event (if the loan is still on)
+        k = ev.month - month
+        if k >= math.ceil(num_payments(b, i, e) - 1e-9):
+            break
+        b, paid = advance(b, i, e, k)
+        month, interest = month + k, interest + paid
+        # Apply the event
+        n_left = num_payments(b, i, e)
+        if ev.kind == "prepay":
+            b -= ev.amount
+        elif ev.kind == "rate":
+            i = ev.rate / 1200
+        else:
+            raise ValueError(f"Unknown event: {ev.kind = }")
+        if b <= 0:  # Paid off with the prepayment
+            return {"total_interest": interest,
+                    "tenure_months": month, "last_emi": e}
+        if ev.adjust == "emi":  # Keep the (remaining) tenure
+            e = float(get_emi(b, i * 12, round(n_left) / 12))
+    # Pay off (the last EMI is partial)
+    n_full = math.ceil(num_payments(b, i, e) - 1e-9) - 1
+    b, paid = advance(b, i, e, n_full)
+    interest += paid + b * i
+    return {"total_interest": interest,
+            "tenure_months": month + n_full + 1, "last_emi": e}
+
+
+# %%
+# Loan amount, yearly interest (%), and tenure (years) of a loan
+def loan_terms(loan: dict) -> tuple[float, float, float]:
+    try:
+        return tuple(float(loan[k]) for k in ("loan_amount", 
+                    "yearly_interest", "loan_tenure_years"))
+    except (KeyError, TypeError, ValueError) as exc:
+        raise ValueError(f"Bad loan: {type(exc).__name__}: "\
+                f"{exc}") from exc
+
+
+# %%
+def simulate_loan(loan: dict) -> list[dict]:
+    """
+        Evaluates all the scenarios of a loan (and the baseline).
+        Returns the rows of the comparison table.
+    """
+    scenarios = {"baseline": []}
+    scenarios.update(loan.get("scenarios", {}))
+    rows, base = [], None
+    for name, events in scenarios.items():
+        try:
+            events = [LoanEvent.from_dict(ev) for ev in events]
+            res = simulate(*loan_terms(loan), events)
+            status = "ok"
+        except ValueError as exc:
+            res = {"total_interest": math.nan,
+                    "tenure_months": math.nan, "last_emi": math.nan}
+            status = str(exc)
+        if base is None:
+            base = res
+        rows.append({"loan_id": loan.get("id"), "scenario": name,
+                "total_interest": res["total_interest"],
+                "interest_saved": base["total_interest"] -
+                                    res["total_interest"],
+                "tenure_months": res["tenure_months"],
+                "tenure_change": res["tenure_months"] -
+                                    base["tenure_months"],
+                "last_emi": res["last_emi"], "status": status})
+    return rows
+
+
+# %%
+def main(args: LocalArgs):
+    print(f"Arguments: {args}")
+    assert os.path.isfile(args.scenario_file), "Need a scenario file"
+    with open(args.scenario_file) as f:
+        loans = json.load(f)
+    if len(loans) >= args.parallel_min_loans and args.jobs != 1:
+        from joblib import Parallel, delayed
+        all_rows = Parallel(n_jobs=args.jobs, batch_size=256)(
+                delayed(simulate_loan)(loan) for loan in loans)
+    else:
+        all_rows = [simulate_loan(loan) for loan in loans]
+    import pandas as pd
+    df = pd.DataFrame([row for rows in all_rows for row in rows])
+    for col in ["tenure_months", "tenure_change"]:  # Failed are NA
+        df[col] = df[col].astype("Int64")
+    df.to_csv(args.out_file, index=False)
+    print(f"Evaluated {len(df)} scenarios of {len(loans)} loans")
+    if len(df) <= 50:
+        print(df.to_string(index=False))
+    print(f"Saved to: {args.out_file}")
+
+
+if __name__ == "__main__" and "ipykernel" not in sys.argv[0]:
+    args = tyro.cli(LocalArgs, description=__doc__)
+    main(args)
+    exit(0)
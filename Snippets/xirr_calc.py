@@ -23,21 +23,143 @@
     # Present value of cash flows (deposit in +ve, withdraw in -ve)
     python ./xirr_calc.py --mode present --date-fmt '%d-%m-%Y' --values 1000 1000 0 --dates 1-1-2020 1-6-2020 1-1-2021 --irr 6
     python ./xirr_calc.py --date-fmt '%d-%b-%Y' --data-file ./Transactions.csv --mode present --irr 10
+    
+    # XIRR of many portfolios (columns: portfolio id, date, value)
+    python ./xirr_calc.py --mode batch-xirr --data-file ./Portfolios.csv --out-file ./xirr_batch.csv
+    
+    # Present value over a grid of rates (1% to 15%) and dates
+    python ./xirr_calc.py --date-fmt '%d-%b-%Y' --data-file ./Transactions.csv --mode sweep --sweep-rates 1 15 --sweep-num 100 --out-file ./pv_sweep.csv --plot
+    
+    # Append cash flows to a saved account (state) and update XIRR
+    python ./xirr_calc.py --mode append --state-file ./account.npz --values 1000 --dates 2024-01-05
     ```
 """
 
 # %%
+# Heavy modules (scipy, pandas, matplotlib, joblib) are imported only
+# in the functions (code paths) that need them (for fast startup)
+import os
 import sys
+import math
 import tyro
-import scipy
-import pandas as pd
-import scipy.optimize
+import hashlib
+import functools
+import numpy as np
 from datetime import datetime
-import matplotlib.pyplot as plt
 from dataclasses import dataclass
 from typing import Optional, Union, Literal
 
 
+# %%
+# Number of days in a year (cached, the same years repeat a lot)
+@functools.lru_cache(maxsize=None)
+def days_in_year(yr: int) -> int:
+    return int(datetime(yr, 12, 31).strftime(r"%j"))
+
+
+# %%
+# Convert dates (strings) to fractional years
+def dates_to_years(dates, date_fmt, 
+            small_size: int = 1000) -> np.ndarray:
+    """
+        Converts the dates (in `date_fmt`) to fractional years like
+        `year + day_of_year / days_in_year`. The whole column of dates
+        is parsed at once (into datetime64) and the fractional years 
+        are computed using array arithmetic. Columns of at most 
+        `small_size` dates (not ISO) are parsed using `strptime` 
+        (importing pandas takes longer than parsing them).
+    """
+    dates = np.asarray(dates, dtype=str)
+    d = None
+    if date_fmt == r"%Y-%m-%d":    # NumPy parses ISO dates directly
+        try:
+            d = dates.astype("datetime64[D]")
+        except ValueError:  # Not zero-padded, etc.
+            pass
+    if d is None and dates.size <= small_size:
+        d = np.array([datetime.strptime(x, date_fmt).date() 
+                    for x in dates.ravel()], dtype="datetime64[D]")\
+                .reshape(dates.shape)
+    if d is None:
+        import pandas as pd
+        d = pd.to_datetime(dates, format=date_fmt).values\
+                .astype("datetime64[D]")
+    y = d.astype("datetime64[Y]")
+    day_of_year = (d - y).astype(np.int64) + 1
+    yrs = y.astype(np.int64) + 1970
+    u_yrs, inv = np.unique(yrs, return_inverse=True)
+    lens = np.array([days_in_year(int(yr)) for yr in u_yrs], 
+                    dtype=np.int64)
+    return yrs + day_of_year / lens[inv]
+
+
+# %%
+# Record of a cash flow in the binary cache (see `read_cashflows`)
+cashflow_dtype = np.dtype([("year", np.float64), ("value", np.float64)])
+
+
+# %%
+def read_cashflows(file, date_fmt, chunk_size: int = 1_000_000, 
+            bin_cache: bool = False):
+    """
+        Reads the dates (first column) and values (second column) of
+        a CSV file in chunks of `chunk_size` rows. Each chunk is 
+        converted straight to float64 (fractional) years and values,
+        so the pandas object columns never hold more than one chunk.
+        Parameters:
+        - file: str             The CSV file
+        - date_fmt: str         Format of the dates in the file
+        - chunk_size: int       Rows per chunk (0 = read at once)
+        - bin_cache: bool       If True, the converted records are 
+                                streamed to a binary cache file (next
+                                to `file`) that is memory-mapped. The
+                                cache is reused if it's newer than the
+                                file (and was made with `date_fmt`).
+        
+        Returns:
+        - years: np.ndarray     Fractional years (float64)
+        - values: np.ndarray    Values (float64)
+    """
+    import pandas as pd
+    fmt_hash = hashlib.md5(date_fmt.encode()).hexdigest()[:8]
+    cache_file = f"{file}.xirr-{fmt_hash}.bin"
+    if bin_cache and os.path.isfile(cache_file) and \
+            os.path.getmtime(cache_file) >= os.path.getmtime(file):
+        recs = np.memmap(cache_file, dtype=cashflow_dtype, mode="r")
+        return recs["year"], recs["value"]
+    reader = pd.read_csv(file, usecols=[0, 1], dtype={0: str}, 
+                        chunksize=chunk_size or None)
+    if not chunk_size:
+        reader = [reader]
+    out = open(f"{cache_file}.tmp", "wb") if bin_cache else None
+    years, values = [], []
+    for chunk in reader:
+        recs = np.empty(len(chunk), dtype=cashflow_dtype)
+        recs["year"] = dates_to_years(chunk.iloc[:, 0], date_fmt)
+        recs["value"] = chunk.iloc[:, 1].to_numpy(np.float64)
+        if out is not None:
+            recs.tofile(out)
+        else:
+            years.append(recs["year"].copy())
+            values.append(recs["value"].copy())
+        del chunk, recs
+    if out is not None:
+        out.close()
+        os.replace(f"{cache_file}.tmp", cache_file)
+        recs = np.memmap(cache_file, dtype=cashflow_dtype, mode="r")
+        return recs["year"], recs["value"]
+    return np.concatenate(years), np.concatenate(values)
+
+
+# %%
+# Read a table (CSV or Parquet, based on the extension)
+def read_table(file, **kwargs):
+    import pandas as pd
+    if file.endswith(".parquet"):
+        return pd.read_parquet(file, **kwargs)
+    return pd.read_csv(file, **kwargs)
+
+
 # %%
 @dataclass
 class LocalArgs:
@@ -73,33 +195,93 @@ class LocalArgs:
         keep this None. The program reads the file and extracts the
         dates (in the `date_fmt`) from the first column and the values
         from the second column. Everything else (including the
-        headings) is ignored.
+        headings) is ignored. The file is read in chunks (see 
+        `chunk_size` and `bin_cache`).
+        In `batch-xirr` mode, the file (CSV or Parquet) has the
+        portfolio ID in the first column, dates in the second column,
+        and values in the third column.
     """
     # Mode of functioning
-    mode: Literal["xirr", "present"] = "xirr"
+    mode: Literal["xirr", "present", "batch-xirr", "append", 
+                    "sweep"] = "xirr"
     """
-        Program has two modes of functioning:
+        Program has the following modes of functioning:
         1. `xirr`: Calculate the XIRR from the cashflows.
         2. `present`: Calculate the present value of the cashflows
                 given an IRR value (interest rate). Need to specify
                 the `years` (or `dates`) of cashflows and `irr` to
                 use. The present value is calculated at the last value
                 in `dates` or `years` (whichever is specified).
+        3. `batch-xirr`: Calculate the XIRR of every portfolio in the
+                `data_file` (grouped by the portfolio ID). The IRR,
+                number of iterations, and status of each portfolio
+                are saved to `out_file`.
+        4. `append`: Append the cashflows to the ones saved in 
+                `state_file` (created if it doesn't exist), update 
+                the XIRR (warm started from the saved IRR), and save
+                the state back.
+        5. `sweep`: Calculate the present value of the cashflows for
+                every rate in `sweep_rates` and valuation date in 
+                `sweep_dates` (or `sweep_years`). The (rate x date) 
+                matrix is saved to `out_file` (CSV or NPY).
     """
     # IRR (for 'present' mode)
     irr: Optional[float] = None
+    # Output file (for 'batch-xirr' and 'sweep' modes)
+    out_file: Optional[str] = None
+    """
+        For `batch-xirr` mode: CSV or Parquet (default is 
+        './xirr_batch.csv'). For `sweep` mode: CSV or NPY (default is
+        './pv_sweep.csv').
+    """
+    # Number of parallel jobs (for 'batch-xirr' mode; -1 = all cores)
+    jobs: int = -1
+    # Minimum number of portfolios to use parallel jobs
+    parallel_min_groups: int = 10_000
+    # Rows per chunk when reading the data file (0 = read at once)
+    chunk_size: int = 1_000_000
+    # Cache the converted data file (binary, memory-mapped on reuse)
+    bin_cache: bool = False
+    # State of the account (for 'append' mode; a '.npz' file)
+    state_file: str = "./xirr_state.npz"
+    # Rates (in %) for 'sweep' mode
+    sweep_rates: Optional[list[float]] = None
+    """
+        The rates (in %) to calculate the present values for. If 
+        `sweep_num` is given, this should be `[start, stop]` and the
+        rates are `sweep_num` evenly spaced values in it.
+    """
+    # Number of rates (for 'sweep' mode; see `sweep_rates`)
+    sweep_num: Optional[int] = None
+    # Valuation dates (in `date_fmt`) for 'sweep' mode
+    sweep_dates: Optional[list[str]] = None
+    """
+        The dates to calculate the present value at. Either this or
+        `sweep_years` can be given. If none are given, the dates of
+        all the cashflows are used.
+    """
+    # Valuation years for 'sweep' mode (instead of `sweep_dates`)
+    sweep_years: Optional[list[float]] = None
+    # Plot the sweep (saved as PNG, next to `out_file`)
+    plot: bool = False
 
     # Validate the function
     def validate(self):
+        if self.out_file is None:
+            self.out_file = "./pv_sweep.csv" if self.mode == "sweep" \
+                    else "./xirr_batch.csv"
+        if self.mode == "batch-xirr":
+            assert self.data_file is not None, "Data file is " \
+                    "required in 'batch-xirr' mode"
+            return
         if self.data_file is not None:
             assert self.values is None and self.years is None \
                 and self.dates is None, \
                     "When data file is specified, do not use " \
                     "--values, --dates, or --years (they're read " \
                     "from the file)."
-            dframe = pd.read_csv(self.data_file)
-            self.dates = dframe.iloc[:, 0].tolist()
-            self.values = dframe.iloc[:, 1].tolist()
+            self.years, self.values = read_cashflows(self.data_file, 
+                    self.date_fmt, self.chunk_size, self.bin_cache)
         # Verify the dates or years arrangement (in command line)
         if self.dates is not None and self.years is not None:
             raise ValueError("Either --dates or --years should be "\
@@ -107,25 +289,499 @@ class LocalArgs:
         if self.years is None and self.dates is None:
             self.years = list(range(len(self.values)))
         elif self.dates is not None:
-            self.years = []
-            for date in self.dates:
-                yr = datetime.strptime(date, self.date_fmt).year
-                n = int(datetime.strptime(date, self.date_fmt)\
-                        .strftime(r"%j"))
-                d = int(datetime.strptime(f"{yr}-12-31", 
-                        r"%Y-%m-%d").strftime(r"%j"))
-                yr = yr + n / d
-                self.years.append(yr)
+            self.years = dates_to_years(self.dates, self.date_fmt)
             self.dates = None   # Just as backup
         # Mode
         if self.mode == "present":
             assert self.irr is not None, "IRR value is required for "\
                     "present value calculation"
+        elif self.mode == "sweep":
+            assert self.sweep_rates is not None, "Rates are " \
+                    "required for the sweep"
+            if self.sweep_num is not None:
+                assert len(self.sweep_rates) == 2, "Need [start, " \
+                        "stop] of rates when `sweep_num` is given"
+                self.sweep_rates = np.linspace(*self.sweep_rates, 
+                                                self.sweep_num)
+            if self.sweep_dates is not None and \
+                    self.sweep_years is not None:
+                raise ValueError("Either --sweep-dates or "\
+                        "--sweep-years should be specified, not both")
+            if self.sweep_dates is not None:
+                self.sweep_years = dates_to_years(self.sweep_dates, 
+                                                    self.date_fmt)
+            elif self.sweep_years is None:
+                self.sweep_years = np.unique(self.years)
+
+
+# %%
+# Result of solving for the IRR
+@dataclass
+class XirrResult:
+    # The IRR (as a fraction, not a percentage)
+    irr: float
+    # Number of solver iterations (Newton + bracketing fallback)
+    num_iter: int
+    # True if the solver converged
+    converged: bool
+
+
+# %%
+class XirrEngine:
+    """
+        Vectorized (NumPy) evaluation of the present value of cash
+        flows. The values and year offsets (from the last year) are
+        kept as contiguous float64 arrays, so the present value and
+        its analytic derivative (w.r.t. the rate) are evaluated in a
+        single pass over the arrays.
+        
+        The present value is at the last year (like the `present` 
+        mode), i.e. `sum(v * (1 + x) ** (years[-1] - years))`.
+        
+        Parameters:
+        - vals: list[float]     Cash flows (deposits +ve)
+        - years: list[float]    Years corresponding to the `vals`
+    """
+    # Rates (fractions) scanned for a bracket when Newton fails
+    bracket_grid = np.concatenate((np.linspace(-0.99, 1.0, 200), 
+                                    np.geomspace(1.0, 1e3, 50)[1:]))
+    # Max elements in a (rates x cashflows) block (memory bound)
+    block_size = 2 ** 22
+    
+    def __init__(self, vals, years):
+        self.vals = np.ascontiguousarray(vals, dtype=np.float64)
+        years = np.ascontiguousarray(years, dtype=np.float64)
+        assert self.vals.ndim == 1 and \
+                self.vals.shape == years.shape, \
+                "Values and years should be 1D (and of same length)"
+        self.dts = years[-1] - years    # Exponents for (1 + x)
+        self.vdts = self.vals * self.dts    # For the derivative
+    
+    def npv(self, x):
+        """
+            Present value for the rate `x` (scalar or an array of
+            rates, the result has the same shape as `x`).
+        """
+        if np.ndim(x) == 0:
+            g = self.dts * np.log1p(x)
+            return float(self.vals @ np.exp(g, out=g))
+        lx = np.log1p(np.asarray(x, dtype=np.float64)).ravel()
+        res = np.empty_like(lx)
+        step = max(1, self.block_size // max(1, len(self.dts)))
+        for i in range(0, len(lx), step):
+            g = np.multiply.outer(lx[i:i+step], self.dts)
+            res[i:i+step] = np.exp(g, out=g) @ self.vals
+        return res.reshape(np.shape(x))
+    
+    def npv_and_deriv(self, x: float):
+        """
+            Present value and its derivative (w.r.t. the rate) for 
+            the rate `x` (scalar), evaluated in one pass.
+        """
+        g = self.dts * np.log1p(x)
+        np.exp(g, out=g)
+        return float(self.vals @ g), float(self.vdts @ g) / (1 + x)
+    
+    def solve(self, guess: float = 0.1, tol: float = 1e-10, 
+                max_iter: int = 50) -> XirrResult:
+        """
+            Solve for the IRR (root of the present value). Newton's 
+            method is used first (with the analytic derivative). If
+            it doesn't converge, a bracket (sign change) is searched
+            on `bracket_grid` (closest to `guess`) and Brent's method
+            is used in the bracket.
+            Parameters:
+            - guess: float      Initial guess (fraction)
+            - tol: float        Relative tolerance (on the rate)
+            - max_iter: int     Maximum Newton iterations
+        """
+        x, n_iter = guess, 0
+        while n_iter < max_iter:
+            n_iter += 1
+            f, df = self.npv_and_deriv(x)
+            if not (np.isfinite(f) and np.isfinite(df)) or df == 0:
+                break
+            x_new = x - f / df
+            if x_new <= -1: # Out of domain, go halfway to -1
+                x = (x - 1) / 2
+                continue
+            if abs(x_new - x) <= tol * (1 + abs(x)):
+                return XirrResult(x_new, n_iter, True)
+            x = x_new
+        return self._solve_bracketed(guess, tol, n_iter)
+    
+    def _solve_bracketed(self, guess, tol, n_iter):
+        grid = self.bracket_grid
+        fs = self.npv(grid)
+        zero = np.flatnonzero(fs == 0)
+        if len(zero):
+            i = zero[np.argmin(np.abs(grid[zero] - guess))]
+            return XirrResult(float(grid[i]), n_iter, True)
+        sc = np.flatnonzero(np.signbit(fs[:-1]) != np.signbit(fs[1:]))
+        sc = sc[np.isfinite(fs[sc]) & np.isfinite(fs[sc + 1])]
+        if len(sc) == 0:    # No root (or all same sign)
+            return XirrResult(float("nan"), n_iter, False)
+        i = sc[np.argmin(np.abs(grid[sc] - guess))]
+        import scipy.optimize
+        root, res = scipy.optimize.brentq(self.npv, grid[i], 
+                grid[i + 1], xtol=tol, full_output=True, 
+                disp=False)
+        return XirrResult(root, n_iter + res.iterations, 
+                            res.converged)
+
+
+# %%
+class IncrementalXirr:
+    """
+        XIRR that is updated as cash flows are appended (in time 
+        order). The present value is anchored at the first cash flow,
+        i.e. `sum(v * (1 + x) ** (years[0] - years))` (this has the 
+        same root as the present value at the last year, but the 
+        existing terms don't change on appending).
+        
+        The present value and its derivative at the last evaluated 
+        rate are cached and updated in O(1) per appended cash flow.
+        So `solve` starts with a free Newton step (warm started from
+        the previous IRR) and usually needs only a couple of passes
+        over the arrays. The state can be saved to (and loaded from) 
+        a '.npz' file.
+        Parameters:
+        - capacity: int     Initial capacity of the arrays
+    """
+    def __init__(self, capacity: int = 1024):
+        self._years = np.empty(max(1, capacity), dtype=np.float64)
+        self._vals = np.empty(max(1, capacity), dtype=np.float64)
+        self.num = 0        # Number of cash flows
+        self.irr = 0.1      # Last IRR (or the initial guess)
+        self.converged = False
+        # Rate at which the sums are cached (and the sums)
+        self._x, self._f, self._df = self.irr, 0.0, 0.0
+    
+    @property
+    def years(self) -> np.ndarray:
+        return self._years[:self.num]
+    
+    @property
+    def values(self) -> np.ndarray:
+        return self._vals[:self.num]
+    
+    def extend(self, years, values):
+        """
+            Append the cash flows (years should be after the existing
+            ones). Also works for a single (year, value) pair.
+        """
+        years = np.atleast_1d(np.asarray(years, dtype=np.float64))
+        values = np.atleast_1d(np.asarray(values, dtype=np.float64))
+        assert years.shape == values.shape, "Shape mismatch"
+        n, k = self.num, len(years)
+        if n + k > len(self._years):    # Grow (amortized O(1))
+            cap = max(2 * len(self._years), n + k)
+            self._years = np.resize(self._years, cap)
+            self._vals = np.resize(self._vals, cap)
+        self._years[n:n+k] = years
+        self._vals[n:n+k] = values
+        self.num += k
+        # Update the cached sums at the cached rate
+        dts = self._years[0] - years
+        g = np.exp(dts * np.log1p(self._x))
+        self._f += float(values @ g)
+        self._df += float((values * dts) @ g) / (1 + self._x)
+    
+    def append(self, year: float, value: float):
+        self.extend(year, value)
+    
+    def _npv_and_deriv(self, x):
+        dts = self._years[0] - self.years
+        g = np.exp(dts * np.log1p(x))
+        vg = self.values * g
+        return float(vg.sum()), float(vg @ dts) / (1 + x)
+    
+    def solve(self, tol: float = 1e-10, max_iter: int = 50) \
+            -> XirrResult:
+        """
+            Update the IRR (Newton's method, warm started from the 
+            previous IRR). Falls back to `XirrEngine.solve` if Newton
+            doesn't converge.
+        """
+        x, f, df = self._x, self._f, self._df
+        n_iter = 0
+        while n_iter < max_iter:
+            n_iter += 1
+            if not (np.isfinite(f) and np.isfinite(df)) or df == 0:
+                break
+            x_new = x - f / df
+            if x_new <= -1: # Out of domain, go halfway to -1
+                x_new = (x - 1) / 2
+            elif abs(x_new - x) <= tol * (1 + abs(x)):
+                self._x, self._f, self._df = x, f, df
+                self.irr, self.converged = x_new, True
+                return XirrResult(x_new, n_iter, True)
+            x = x_new
+            f, df = self._npv_and_deriv(x)
+        # Fallback (bracketing), keep the sums at the new IRR
+        guess = self.irr if np.isfinite(self.irr) else 0.1
+        res = XirrEngine(self.values, self.years).solve(guess, tol, 
+                                                        max_iter)
+        res.num_iter += n_iter
+        self.irr, self.converged = res.irr, res.converged
+        if res.converged:
+            self._x = res.irr
+            self._f, self._df = self._npv_and_deriv(self._x)
+        return res
+    
+    def save(self, file: str):
+        # Through a file object (`np.savez` adds '.npz' to names)
+        with open(file, "wb") as f:
+            np.savez(f, years=self.years, values=self.values, 
+                    irr=self.irr, converged=self.converged, 
+                    cache=[self._x, self._f, self._df])
+    
+    @classmethod
+    def load(cls, file: str) -> "IncrementalXirr":
+        data = np.load(file)
+        obj = cls(capacity=2 * len(data["years"]))
+        n = len(data["years"])
+        obj._years[:n], obj._vals[:n] = data["years"], data["values"]
+        obj.num = n
+        obj.irr = float(data["irr"])
+        obj.converged = bool(data["converged"])
+        obj._x, obj._f, obj._df = map(float, data["cache"])
+        return obj
+
+
+# %%
+# Pure Python solver (for small inputs, no NumPy or SciPy overheads)
+def solve_xirr_small(vals, years, guess: float = 0.1, 
+            tol: float = 1e-10, max_iter: int = 50) -> XirrResult:
+    """
+        Same as `XirrEngine.solve`, but in pure Python (using `math`).
+        For a few cash flows, this is faster than creating arrays. The
+        fallback bisects the bracket (closest to `guess`) found on 
+        `XirrEngine.bracket_grid`, so SciPy is never imported.
+    """
+    vals = [float(v) for v in vals]
+    dts = [float(years[-1]) - float(y) for y in years]
+    def npv_and_deriv(x):
+        try:
+            lx = math.log1p(x)
+            gs = [v * math.exp(lx * d) for v, d in zip(vals, dts)]
+        except (ValueError, OverflowError):
+            return math.nan, math.nan
+        return math.fsum(gs), \
+                math.fsum(g * d for g, d in zip(gs, dts)) / (1 + x)
+    x, n_iter = guess, 0
+    while n_iter < max_iter:
+        n_iter += 1
+        f, df = npv_and_deriv(x)
+        if not (math.isfinite(f) and math.isfinite(df)) or df == 0:
+            break
+        x_new = x - f / df
+        if x_new <= -1: # Out of domain, go halfway to -1
+            x = (x - 1) / 2
+            continue
+        if abs(x_new - x) <= tol * (1 + abs(x)):
+            return XirrResult(x_new, n_iter, True)
+        x = x_new
+    # Bracket (sign change closest to the guess) and bisect
+    grid = XirrEngine.bracket_grid.tolist()
+    fs = [npv_and_deriv(r)[0] for r in grid]
+    brackets = [i for i in range(len(grid) - 1) 
+                if math.isfinite(fs[i]) and math.isfinite(fs[i + 1]) 
+                    and (fs[i] == 0 or (fs[i] < 0) != (fs[i + 1] < 0))]
+    if not brackets:
+        return XirrResult(math.nan, n_iter, False)
+    i = min(brackets, key=lambda i: abs(grid[i] - guess))
+    (a, fa), b = (grid[i], fs[i]), grid[i + 1]
+    while fa != 0 and b - a > tol * (1 + abs(a)):
+        n_iter += 1
+        m = (a + b) / 2
+        fm = npv_and_deriv(m)[0]
+        if (fm < 0) == (fa < 0):
+            a, fa = m, fm
+        else:
+            b = m
+    return XirrResult(a if fa == 0 else (a + b) / 2, n_iter, True)
+
+
+# %%
+def solve_xirr(vals, years, guess: float = 0.1, 
+            small_size: int = 64) -> XirrResult:
+    """
+        Solve for the IRR. Inputs with at most `small_size` cash flows
+        use the pure Python solver, the rest use the `XirrEngine`.
+    """
+    if len(vals) <= small_size:
+        return solve_xirr_small(vals, years, guess)
+    return XirrEngine(vals, years).solve(guess)
+
+
+# %%
+def present_value_sweep(vals, years, rates, val_years) -> np.ndarray:
+    """
+        Present value of the cash flows for every rate (fraction) in
+        `rates` and valuation year in `val_years`. Uses
+        `(1 + r) ** (V - t) = (1 + r) ** (V - T) * (1 + r) ** (T - t)`
+        (with `T` as the last year), so the matrix is one broadcasted
+        product with the present values (at `T`) for all the rates.
+        Returns a (len(rates), len(val_years)) matrix.
+    """
+    engine = XirrEngine(vals, years)
+    t_last = float(np.asarray(years, dtype=np.float64)[-1])
+    lr = np.log1p(np.asarray(rates, dtype=np.float64))
+    dv = np.asarray(val_years, dtype=np.float64) - t_last
+    pv = np.exp(np.multiply.outer(lr, dv))
+    pv *= engine.npv(np.asarray(rates, dtype=np.float64))[:, None]
+    return pv
 
 
 # %%
 # Return a function that takes in interest rate and gives present val
 def year_value_opt_func_generator(vals, years):
+    return XirrEngine(vals, years).npv
+
+
+# %%
+def solve_xirr_ragged(vals, dts, counts, guess: float = 0.1, 
+            tol: float = 1e-10, max_iter: int = 50):
+    """
+        Solve for the IRR of many groups (portfolios) of cash flows at
+        once (Newton's method, vectorized across the groups). The cash
+        flows are in a ragged layout: flat arrays with the groups 
+        stored one after the other. Converged groups are dropped from
+        the working arrays as the iterations proceed.
+        Parameters:
+        - vals: np.ndarray      Cash flows (flat, float64)
+        - dts: np.ndarray       Exponents for `(1 + x)` (years from 
+                                the last cash flow of the group)
+        - counts: np.ndarray    Number of cash flows in each group
+                                (all should be > 0)
+        - guess: float          Initial guess (fraction)
+        - tol: float            Relative tolerance (on the rate)
+        - max_iter: int         Maximum Newton iterations
+        
+        Returns:
+        - irr: np.ndarray       IRR of each group (fraction)
+        - num_iter: np.ndarray  Number of iterations of each group
+        - converged: np.ndarray True if the group converged
+    """
+    num_groups = len(counts)
+    irr = np.full(num_groups, guess, dtype=np.float64)
+    num_iter = np.zeros(num_groups, dtype=np.int64)
+    converged = np.zeros(num_groups, dtype=bool)
+    # Working set (only groups that haven't converged)
+    idx = np.arange(num_groups)
+    v, d, c = vals, dts, np.asarray(counts)
+    vd = v * d
+    x = irr.copy()
+    for it in range(1, max_iter + 1):
+        starts = np.concatenate(([0], np.cumsum(c)[:-1]))
+        g = d * np.log1p(np.repeat(x, c))
+        np.exp(g, out=g)
+        f = np.add.reduceat(v * g, starts)
+        df = np.add.reduceat(vd * g, starts) / (1 + x)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x_new = x - f / df
+        bad = ~np.isfinite(x_new)
+        clip = x_new <= -1  # Out of domain, go halfway to -1
+        x_new = np.where(clip, (x - 1) / 2, x_new)
+        done = ~(bad | clip) & (np.abs(x_new - x) <= tol * (1 + 
+                np.abs(x)))
+        num_iter[idx] = it
+        irr[idx] = np.where(bad, np.nan, x_new)
+        converged[idx[done]] = True
+        keep = ~(done | bad)
+        if keep.all():
+            x = x_new
+            continue
+        em = np.repeat(keep, c)
+        v, d, vd = v[em], d[em], vd[em]
+        c, idx, x = c[keep], idx[keep], x_new[keep]
+        if len(idx) == 0:
+            break
+    return irr, num_iter, converged
+
+
+# %%
+def _solve_xirr_chunk(vals, dts, counts):
+    """
+        Ragged Newton for a chunk of groups, with a fallback to 
+        `XirrEngine.solve` (bracketing) for groups that didn't 
+        converge. Returns (irr, num_iter, status).
+    """
+    irr, num_iter, converged = solve_xirr_ragged(vals, dts, counts)
+    status = np.where(converged, "newton", "failed").astype(object)
+    ends = np.cumsum(counts)
+    for i in np.flatnonzero(~converged):
+        s, e = ends[i] - counts[i], ends[i]
+        engine = XirrEngine(vals[s:e], -dts[s:e])
+        res = engine.solve()
+        irr[i], num_iter[i] = res.irr, num_iter[i] + res.num_iter
+        if res.converged:
+            status[i] = "fallback"
+    return irr, num_iter, status
+
+
+# %%
+def batch_xirr(ids, years, vals, jobs: int = -1, 
+            parallel_min_groups: int = 10_000) -> "pd.DataFrame":
+    """
+        XIRR of every portfolio (group of cash flows with the same ID).
+        The present (reference) of each portfolio is its last cash 
+        flow (in the given order). Large inputs are split into chunks
+        of portfolios and solved using parallel jobs.
+        Parameters:
+        - ids: array-like           Portfolio ID of each cash flow
+        - years: array-like         (Fractional) years of cash flows
+        - vals: array-like          Cash flows
+        - jobs: int                 Number of parallel jobs
+        - parallel_min_groups: int  Minimum groups for parallel jobs
+        
+        Returns a DataFrame with the columns: "id", "irr_pct", 
+        "num_iter", and "status" ('newton', 'fallback', or 'failed').
+        Cash flows without an ID (null) are left out (with a warning).
+    """
+    import pandas as pd
+    codes, uniques = pd.factorize(np.asarray(ids))
+    years = np.asarray(years, dtype=np.float64)
+    vals = np.asarray(vals, dtype=np.float64)
+    if (codes < 0).any():
+        print(f"Warning: Skipped {np.count_nonzero(codes < 0)} cash "\
+                f"flows without a portfolio ID")
+        has_id = codes >= 0
+        codes, years, vals = codes[has_id], years[has_id], vals[has_id]
+    assert len(codes) > 0, "No cash flows with a portfolio ID"
+    order = np.argsort(codes, kind="stable")
+    counts = np.bincount(codes, minlength=len(uniques))
+    years = years[order]
+    vals = np.ascontiguousarray(vals[order])
+    last_years = years[np.cumsum(counts) - 1]
+    dts = np.repeat(last_years, counts) - years
+    # Split into chunks of groups
+    num_chunks = 1
+    if len(uniques) >= parallel_min_groups and jobs != 1:
+        num_chunks = 4 * (os.cpu_count() if jobs < 0 else jobs)
+        num_chunks = min(num_chunks, len(uniques))  # None empty
+    g_bounds = np.linspace(0, len(uniques), num_chunks + 1)\
+                .astype(int)
+    e_bounds = np.concatenate(([0], np.cumsum(counts)))[g_bounds]
+    chunks = [(vals[e_bounds[i]:e_bounds[i+1]], 
+                dts[e_bounds[i]:e_bounds[i+1]], 
+                counts[g_bounds[i]:g_bounds[i+1]]) 
+            for i in range(num_chunks)]
+    if num_chunks == 1:
+        results = [_solve_xirr_chunk(*chunks[0])]
+    else:
+        from joblib import Parallel, delayed
+        results = Parallel(n_jobs=jobs)(delayed(_solve_xirr_chunk)\
+                (*chunk) for chunk in chunks)
+    irr, num_iter, status = map(np.concatenate, zip(*results))
+    return pd.DataFrame({"id": uniques, "irr_pct": irr * 100, 
+            "num_iter": num_iter, "status": status})
+
+
+# %%
+# Reference (pure Python) present value function (for benchmarks)
+def year_value_loop_func_generator(vals, years):
     rev_vals = list(reversed(vals))   # [present, ..., past]
     rev_years = list(reversed(years))
     # Function to generate current value given interest
@@ -142,24 +798,85 @@ if __name__ == "__main__" and "ipykernel" not in sys.argv[0]:
     args = tyro.cli(LocalArgs, description=__doc__)
     print(f"Arguments: {args}")
     args.validate()
-    opt_func = year_value_opt_func_generator(args.values, args.years)
+    if args.mode == "batch-xirr":
+        dframe = read_table(args.data_file)
+        years = dates_to_years(dframe.iloc[:, 1].astype(str), 
+                                args.date_fmt)
+        res = batch_xirr(dframe.iloc[:, 0], years, dframe.iloc[:, 2], 
+                        args.jobs, args.parallel_min_groups)
+        res = res.rename(columns={"id": dframe.columns[0]})
+        if args.out_file.endswith(".parquet"):
+            res.to_parquet(args.out_file, index=False)
+        else:
+            res.to_csv(args.out_file, index=False)
+        print(f"Solved {len(res)} portfolios, status counts: "\
+                f"{res['status'].value_counts().to_dict()}")
+        print(f"Saved to: {args.out_file}")
+        exit(0)
+    if args.mode == "append":
+        if os.path.isfile(args.state_file):
+            inc = IncrementalXirr.load(args.state_file)
+            print(f"Loaded {inc.num} cashflows from {args.state_file}")
+        else:
+            inc = IncrementalXirr()
+        inc.extend(args.years, args.values)
+        res = inc.solve()
+        inc.save(args.state_file)
+        if not res.converged:
+            print(f"Warning: Solver did not converge ({res})")
+        print(f"IRR: {round(res.irr * 100, 3)} % ({inc.num} cashflows"\
+                f", {res.num_iter} iterations)")
+        print(f"Saved state to: {args.state_file}")
+        exit(0)
+    if args.mode == "sweep":
+        rates = np.asarray(args.sweep_rates, dtype=np.float64)
+        val_years = np.asarray(args.sweep_years, dtype=np.float64)
+        pv = present_value_sweep(args.values, args.years, rates / 100,
+                                val_years)
+        if args.out_file.endswith(".npy"):
+            np.save(args.out_file, pv)
+        else:
+            import pandas as pd
+            cols = args.sweep_dates if args.sweep_dates is not None \
+                    else val_years
+            df = pd.DataFrame(pv, index=pd.Index(rates, 
+                    name="Rate (%)"), columns=cols)
+            df.to_csv(args.out_file)
+        print(f"Present values: {pv.shape[0]} rates x {pv.shape[1]} "\
+                f"valuation dates, saved to: {args.out_file}")
+        if args.plot:
+            import matplotlib.pyplot as plt
+            fig, ax = plt.subplots(figsize=(8, 6))
+            mesh = ax.pcolormesh(val_years, rates, pv, shading="auto")
+            fig.colorbar(mesh, ax=ax, label="Present value")
+            ax.set_xlabel("Valuation year")
+            ax.set_ylabel("Rate (%)")
+            ax.set_title("Present value of cashflows")
+            plot_file = f"{os.path.splitext(args.out_file)[0]}.png"
+            fig.savefig(plot_file, dpi=150, bbox_inches="tight")
+            print(f"Saved plot to: {plot_file}")
+        exit(0)
     if args.mode == "xirr":
-        irr = scipy.optimize.fsolve(opt_func, 0.1)[0]
-        print(f"IRR: {round(irr * 100, 3)} %")
+        res = solve_xirr(args.values, args.years, 0.1)
+        if not res.converged:
+            print(f"Warning: Solver did not converge ({res})")
+        print(f"IRR: {round(res.irr * 100, 3)} %")
     elif args.mode == "present":
-        pv = opt_func(args.irr / 100)
+        pv = XirrEngine(args.values, args.years).npv(args.irr / 100)
         print(f"Present value: {round(pv, 4)}")
     exit(0)
 
 
 # %%
 # Experimental section
-import pandas as pd
 
 # %%
 data_file = "./Transactions.csv"
 
 # %%
-data = pd.read_csv(data_file)
+# Only when interactive (the module is also imported by other scripts)
+if "ipykernel" in sys.argv[0]:
+    import pandas as pd
+    data = pd.read_csv(data_file)
 
 # %%
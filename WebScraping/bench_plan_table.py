@@ -0,0 +1,121 @@
+# Benchmark collecting the plans into a table (see recharge_packs.py)
+"""
+    Compares filling an empty DataFrame cell by cell (`df.at`, the
+    earlier way) with collecting the plans in `PlanColumns` (typed
+    columns, converted to a DataFrame once) on synthetic plans. Both
+    should give the same values. The time to parse a synthetic airtel
+    page with the same plans is also reported.
+
+    Example calls:
+    ```bash
+    python ./bench_plan_table.py
+    python ./bench_plan_table.py --num-plans 1000 --repeats 5
+    ```
+"""
+
+# %%
+import sys
+import tyro
+import time
+import random
+import pandas as pd
+from dataclasses import dataclass
+from recharge_packs import PlanColumns, sheet_columns, parse_airtel
+
+
+# %%
+@dataclass
+class LocalArgs:
+    # Number of plans (in a sheet)
+    num_plans: int = 10_000
+    # Number of repeats (best time is reported)
+    repeats: int = 3
+    # Seed for the random number generator
+    seed: int = 0
+
+
+# %%
+# Plans as (cost, validity, data size, data renewal)
+def synthetic_plans(n, seed=0):
+    rng = random.Random(seed)
+    plans = []
+    for _ in range(n):
+        renewal = rng.choice(["Daily", "Data", "Unlimited"])
+        size = -1.0 if renewal == "Unlimited" else \
+                rng.choice([0.5, 1.0, 1.5, 2.0, 3.0, 24.0])
+        plans.append((rng.randint(10, 3000),
+                    rng.choice([1, 28, 56, 84, 365]), size, renewal))
+    return plans
+
+
+# %%
+# An airtel page (one tab) with the plans (see `parse_airtel`)
+def synthetic_airtel_html(plans):
+    cards = []
+    for cost, validity, size, renewal in plans:
+        size, sub = ("Unlimited", "Unlimited") if size < 0 else \
+                (f"{size:g}GB", "/day" if renewal == "Daily" else "Data")
+        cards.append('<div class="pack-card-left-section">'\
+            '<div class="pack-card-detail"><p class="pack-card-heading">'\
+            f'₹{cost}</p></div>'\
+            '<div class="pack-card-detail"><p class="pack-card-heading">'\
+            f'{size}</p><p class="pack-card-sub-heading">{sub}</p></div>'\
+            f'<div class="pack-card-detail"><p>{validity} Days</p>'\
+            '<p>Validity</p></div></div>')
+    return '<html><body><div class="tabs-single-content" '\
+            f'data-tab-name="Synthetic">{"".join(cards)}</div>'\
+            '</body></html>'
+
+
+# %%
+# Filling an empty DataFrame cell by cell (the earlier way)
+def fill_df_at(plans):
+    df = pd.DataFrame(columns=sheet_columns)
+    for i, plan in enumerate(plans):
+        for j, v in enumerate(plan):
+            df.at[i, df.columns[j]] = v
+    return df
+
+
+# %%
+def fill_columns(plans):
+    cols = PlanColumns()
+    for plan in plans:
+        cols.append(*plan)
+    return cols.to_frame()
+
+
+# %%
+def best_time(func, repeats):
+    best, res = float("inf"), None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        res = func()
+        best = min(best, time.perf_counter() - start)
+    return best, res
+
+
+# %%
+def main(args: LocalArgs):
+    print(f"Arguments: {args}")
+    plans = synthetic_plans(args.num_plans, args.seed)
+    t_ref, df_ref = best_time(lambda: fill_df_at(plans), args.repeats)
+    t_new, df_new = best_time(lambda: fill_columns(plans), args.repeats)
+    assert (df_ref.astype(df_new.dtypes.to_dict()) == df_new).all()\
+            .all(), "Tables don't agree"
+    print(f"df.at:       {t_ref * 1e3:10.2f} ms (dtypes: "\
+            f"{sorted(set(map(str, df_ref.dtypes)))})")
+    print(f"PlanColumns: {t_new * 1e3:10.2f} ms (dtypes: "\
+            f"{sorted(set(map(str, df_new.dtypes)))})")
+    print(f"Speedup: {t_ref / t_new:.1f}x")
+    html = synthetic_airtel_html(plans)
+    t_parse, dfs = best_time(lambda: parse_airtel(html), args.repeats)
+    assert (dfs["pd"][0] == df_new).all().all(), "Parsed plans differ"
+    print(f"Parse page:  {t_parse * 1e3:10.2f} ms "\
+            f"({len(html) / 2**20:.1f} MB of HTML)")
+
+
+if __name__ == "__main__" and "ipykernel" not in sys.argv[0]:
+    args = tyro.cli(LocalArgs, description=__doc__)
+    main(args)
+    exit(0)
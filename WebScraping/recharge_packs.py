@@ -1,10 +1,40 @@
 # Scrap plans for pre-paid recharge from websites
 """
     Because I'm too lazy to go through all plans. Just scrap them 
-    using selenium, save them to an ODS spreadsheet, and analyze.
+    using selenium, save them (Parquet snapshots and, optionally, an
+    ODS spreadsheet), and analyze.
     Give me the cheapest plans (based on daily cost) with daily and
     fixed data renewals.
     
+    The page is loaded once (selenium) and its HTML source is parsed
+    (lxml, using the class names of the website). The HTML can be 
+    saved (`--save-html`) and parsed later without a browser 
+    (`--html-file`). See the `fixtures` folder for (trimmed) examples.
+    
+    With `--all-providers`, the pages of all the providers (that have
+    a parser) are loaded together (headless browsers) and parsed. The
+    plans are also exported as one table (with 'Provider' and 'Sheet'
+    columns) in `all-packs.ods` (with `--export-ods`). Saved pages 
+    (like the fixtures) can be served locally and loaded without a 
+    browser (`--fetch http`).
+    
+    Every scrape is saved as a snapshot (Parquet file) of each 
+    provider in `store_dir` (named like 
+    '{provider}/{YYYYmmdd-HHMMSS-ffffff}.parquet', with a 'Scraped At'
+    column; microseconds, as runs can be less than a second apart). 
+    The analysis uses the scraped plans (in memory), or the latest 
+    snapshot with `--from-store` (no scraping). See `load_history` 
+    for all the snapshots. Plans parsed from saved HTML (or with 
+    `--fetch http`) are only saved (and kept in the history) with 
+    `--store`, so that the fixtures don't mix with the real plans.
+    
+    The changes of the plans are also kept in a SQLite database 
+    (`history_db`, append-only). Each plan has a key (hash of the 
+    provider, sheet, cost, validity, and data). A scrape is compared
+    with the plans active after the last scrape, and only the plans
+    that were added or removed are saved (a price change is a removed
+    and an added plan). See `cheapest_over_time` (`--show-history`).
+    
     Warning: Use at your own risk. Always confirm details from the
         official websites.
     
@@ -30,24 +60,39 @@
     Notes for future improvements:
     - Maybe add functions for Jio as well
         - https://www.jio.com/selfcare/plans/mobility/jiophone-plans/
+    
+    Example calls:
+    ```bash
+    python ./recharge_packs.py --net-provider vi --save-html ./vi-packs.html
+    python ./recharge_packs.py --net-provider airtel --html-file ./fixtures/airtel-packs.html
+    python ./recharge_packs.py --all-providers --export-ods
+    python ./recharge_packs.py --net-provider vi --from-store --sheet-num 1
+    python ./recharge_packs.py --all-providers --from-store --show-history
+    python -m http.server -d ./fixtures 8000 &
+    python ./recharge_packs.py --all-providers --fetch http --addrs airtel http://localhost:8000/airtel-packs.html vi http://localhost:8000/vi-packs.html
+    ```
 """
 
 # %%
 import os
 import sys
 import pdb
+import json
 import tyro
 import time
+import sqlite3
+import hashlib
 import logging
+import functools
 import traceback
+import lxml.html
+import lxml.etree
 import pandas as pd
-from typing import Literal
-from selenium import webdriver
+from array import array
+from datetime import datetime
+from typing import Literal, Optional
 from dataclasses import dataclass, field
-from selenium.webdriver.common.by import By
-from selenium.webdriver import ActionChains
-from selenium.common.exceptions import \
-        ElementClickInterceptedException
+from concurrent.futures import ThreadPoolExecutor
 
 
 # %%
@@ -65,6 +110,42 @@ def find_non_integer_or_period(text):
 # %%
 sheet_columns = ["Cost (INR)", "Validity (Days)", "Data Size (GB)", 
                     "Data Renewal"]
+# Types of the columns (see `PlanColumns`)
+sheet_dtypes = ["int64", "float64", "float64", "string"]
+
+
+# %%
+class PlanColumns:
+    """
+        Plans of a sheet, collected as columns (typed arrays for the
+        numbers) and converted to a DataFrame (with `sheet_dtypes`) 
+        once, at the end. Filling an empty DataFrame cell by cell 
+        makes pandas grow it on every new row and leaves all columns 
+        as 'object'.
+    """
+    __slots__ = ("cost", "validity", "data_size", "data_renewal")
+    
+    def __init__(self):
+        self.cost = array("q")          # In INR
+        self.validity = array("d")      # In days
+        self.data_size = array("d")     # In GB
+        self.data_renewal = []
+    
+    def append(self, cost, validity, data_size, data_renewal):
+        self.cost.append(int(cost))
+        self.validity.append(float(validity))
+        self.data_size.append(float(data_size))
+        self.data_renewal.append(data_renewal)
+    
+    def __len__(self):
+        return len(self.cost)
+    
+    def to_frame(self) -> pd.DataFrame:
+        cols = (self.cost, self.validity, self.data_size, 
+                self.data_renewal)
+        return pd.DataFrame({name: pd.array(col, dtype=dtype) 
+                for name, col, dtype in zip(sheet_columns, cols, 
+                                            sheet_dtypes)})
 
 
 # %%
@@ -72,8 +153,40 @@ sheet_columns = ["Cost (INR)", "Validity (Days)", "Data Size (GB)",
 class LocalArgs:
     # Network provider
     net_provider: Literal["airtel", "jio", "vi"] = "airtel"
-    # Sheet number to analyze (see the ODS file for all packs)
+    # Sheet number to analyze (in the order of the page)
     sheet_num: int = -1
+    # Saved HTML of the page to parse (None = load the web page)
+    html_file: Optional[str] = None
+    # Save the HTML of the loaded web page to this file
+    """
+        With `--all-providers`, this is a folder (the HTML of each 
+        provider is saved as '{provider}-packs.html').
+    """
+    save_html: Optional[str] = None
+    # Scrape all the providers (that have a parser) together
+    all_providers: bool = False
+    # Folder of saved HTML ('{provider}-packs.html'; --all-providers)
+    html_dir: Optional[str] = None
+    # Load the pages in a browser or (static pages only) using HTTP
+    fetch: Literal["browser", "http"] = "browser"
+    # Use a headless browser (always for --all-providers)
+    headless: bool = False
+    # Web addresses to use instead of `web_addrs` (provider: address)
+    addrs: dict[str, str] = field(default_factory=dict)
+    # Max number of pages loaded together (for --all-providers)
+    jobs: int = 4
+    # Folder of the snapshots of the plans (Parquet files)
+    store_dir: str = "./plans"
+    # Also save the plans of saved HTML or --fetch http (not live)
+    store: bool = False
+    # Analyze the latest snapshot in the store (don't scrape)
+    from_store: bool = False
+    # Also export the plans to ODS ('{provider}-packs.ods')
+    export_ods: bool = False
+    # History of the plan changes (SQLite; None = don't keep it)
+    history_db: Optional[str] = "./plans/history.db"
+    # Show the cheapest plans over time (from the history)
+    show_history: bool = False
 
 
 # %%
@@ -84,34 +197,126 @@ web_addrs = {
 
 
 # %%
-# Get airtel prepaid data
-def grab_airtel(driver):
-    elems = driver.find_elements(By.CLASS_NAME, "tabs-single-content")
+# Class of the elements with the plans (to wait for them to load)
+plan_classes = {
+    "airtel": "tabs-single-content",
+    "vi": "recg_revamp_packdetails",
+}
+
+
+# %%
+def grab_page(provider, web_addr=None, headless=False):
+    """
+        Loads the web page of the provider (selenium, Chrome) and
+        returns its HTML source (after the plans are loaded). The 
+        plans are parsed from it (without more calls to the browser).
+    """
+    from selenium import webdriver
+    from selenium.webdriver.common.by import By
+    options = webdriver.ChromeOptions()
+    if headless:
+        options.add_argument("--headless=new")
+    driver = webdriver.Chrome(options=options)
+    try:
+        driver.get(web_addr or web_addrs[provider])
+        driver.implicitly_wait(2)   # Max timeout of 2 sec
+        driver.find_elements(By.CLASS_NAME, plan_classes[provider])
+        return driver.page_source
+    finally:
+        driver.quit()
+
+
+# %%
+# HTML of a static page (without a browser, like a saved page)
+def fetch_page(web_addr):
+    import urllib.request
+    with urllib.request.urlopen(web_addr, timeout=30) as resp:
+        charset = resp.headers.get_content_charset() or "utf-8"
+        return resp.read().decode(charset)
+
+
+# %%
+# Elements (under `elem`) having the class name (like `By.CLASS_NAME`)
+def find_by_class(elem, class_name):
+    return _class_xpath(class_name)(elem)
+
+
+# %%
+# Compiled XPath (reused for all the elements) to find a class name
+@functools.lru_cache(maxsize=None)
+def _class_xpath(class_name):
+    return lxml.etree.XPath(".//*[contains(concat(' ', "\
+            f"normalize-space(@class), ' '), ' {class_name} ')]")
+
+
+# %%
+# First element (under `elem`) having the class name
+def find_one_by_class(elem, class_name):
+    found = find_by_class(elem, class_name)
+    if len(found) == 0:
+        raise ValueError(f"No element with class '{class_name}'")
+    return found[0]
+
+
+# %%
+# Text of the element (lines, like the `.text` of selenium)
+def elem_text(elem):
+    return "\n".join(" ".join(t.split()) for t in visible_text(elem) 
+                        if t.strip())
+
+
+# %%
+# Whether the element isn't rendered (`hidden`, 'd-none', or styled)
+def is_hidden(elem):
+    if elem.tag in ("script", "style", "template") or \
+            elem.get("hidden") is not None or \
+            "d-none" in elem.get("class", "").split():
+        return True
+    style = "".join(elem.get("style", "").split()).lower()
+    return "display:none" in style or "visibility:hidden" in style
+
+
+# %%
+# Texts of the element, without the hidden elements (and comments)
+def visible_text(elem):
+    if is_hidden(elem):
+        return
+    if elem.text and isinstance(elem.tag, str):
+        yield elem.text
+    for child in elem:
+        if isinstance(child.tag, str):
+            yield from visible_text(child)
+        if child.tail:
+            yield child.tail
+
+
+# %%
+# Get airtel prepaid data (from the HTML of the page)
+def parse_airtel(html: str):
+    root = lxml.html.fromstring(html)
+    elems = find_by_class(root, "tabs-single-content")
     dfs = { # The names of the plans (spreadsheet) and their content
         "names": [],
         "pd": [],
     }
     for elem in elems:
         # Each is a separate tab
-        sheet_name = elem.get_attribute("data-tab-name")
+        sheet_name = elem.get("data-tab-name")
         if sheet_name in ["International Roaming", 
                     "Inflight Roaming packs"] or \
                 sheet_name.startswith("Talktime"):
             continue
-        df = pd.DataFrame(columns=sheet_columns)
+        plans = PlanColumns()
         # Get all plans
-        packs = elem.find_elements(By.CLASS_NAME, 
-                                    "pack-card-left-section")
-        for i, pack in enumerate(packs):
+        packs = find_by_class(elem, "pack-card-left-section")
+        for pack in packs:
             # Each is a plan
-            details = pack.find_elements(By.CLASS_NAME, 
-                                        "pack-card-detail")
+            details = find_by_class(pack, "pack-card-detail")
             # Cost of plan
-            cost = details[0].find_element(By.CLASS_NAME, # In INR
-                                        "pack-card-heading").text[1:]
-            df.at[i, df.columns[0]] = int(cost)
+            cost = elem_text(find_one_by_class(details[0], # In INR
+                                        "pack-card-heading"))[1:]
             # Validity (duration) of plan
-            validity_segment = details[2].text.split("\n")
+            validity_segment = elem_text(details[2]).split("\n")
             assert validity_segment[1].lower() == "validity"
             validity = validity_segment[0].lower().split()  # Heading
             if len(validity) == 1:
@@ -125,12 +330,11 @@ def grab_airtel(driver):
                 validity = int(validity[0]) * 28
             else:
                 raise ValueError(f"Unknown validity: {validity}")
-            df.at[i, df.columns[1]] = validity
             # Amount of data and renewal (validity) of data in plan
-            data_size = details[1].find_element(By.CLASS_NAME, 
-                                        "pack-card-heading").text
-            data_renewal = details[1].find_element(By.CLASS_NAME, 
-                                    "pack-card-sub-heading").text
+            data_size = elem_text(find_one_by_class(details[1], 
+                                        "pack-card-heading"))
+            data_renewal = elem_text(find_one_by_class(details[1], 
+                                    "pack-card-sub-heading"))
             if data_size[-2:] == "GB":
                 data_size = data_size[:-2]
                 if data_renewal.upper() == "/DAY":
@@ -142,35 +346,34 @@ def grab_airtel(driver):
             else:
                 data_size = -1  # "Unlimited" data case
                 assert data_renewal.lower() == "unlimited"
-            df.at[i, df.columns[2]] = float(data_size)
-            df.at[i, df.columns[3]] = data_renewal.title()
+            plans.append(cost, validity, data_size, 
+                        data_renewal.title())
         dfs["names"].append(sheet_name)
-        dfs["pd"].append(df)
+        dfs["pd"].append(plans.to_frame())
     return dfs
 
 
 # %%
-def grab_vi(driver):
-    elems = driver.find_elements(By.CLASS_NAME, 
-                "recg_revamp_packdetails")
+# Get Vi prepaid data (from the HTML of the page)
+def parse_vi(html: str):
+    root = lxml.html.fromstring(html)
+    elems = find_by_class(root, "recg_revamp_packdetails")
     dfs = { # The names of the plans (spreadsheet) and their content
         "names": [],
         "pd": [],
     }
     for elem in elems:
-        if 'd-none' in elem.get_attribute("class").split():
+        if 'd-none' in elem.get("class", "").split():
             continue
-        sheet_name = elem.find_element(By.CLASS_NAME, 
-                                    "pack-title").text.title()
-        df = pd.DataFrame(columns=sheet_columns)
-        plans = elem.find_elements(By.CLASS_NAME, "orc_cardtopsec")
-        i = 0
-        for plan in plans:
+        sheet_name = elem_text(find_one_by_class(elem, 
+                                    "pack-title")).title()
+        plans = PlanColumns()
+        for plan in find_by_class(elem, "orc_cardtopsec"):
             # Cost of plan
-            cost = plan.find_element(By.CLASS_NAME, "orc_mrp").text
+            cost = elem_text(find_one_by_class(plan, "orc_mrp"))
             # Validity
-            pack_validity = plan.find_element(By.CLASS_NAME, 
-                                    "orcvalidityval").text.title()
+            pack_validity = elem_text(find_one_by_class(plan, 
+                                    "orcvalidityval")).title()
             if pack_validity == '':
                 continue
             pack_dur, pack_val_unit = pack_validity.split()
@@ -181,8 +384,8 @@ def grab_vi(driver):
             elif not pack_val_unit.startswith("Day"):
                 raise ValueError(f"Unknown unit {pack_val_unit = }")
             # Data
-            data_val = plan.find_element(By.CLASS_NAME, 
-                            "orcdataval").text.split("/")
+            data_val = elem_text(find_one_by_class(plan, 
+                            "orcdataval")).split("/")
             if data_val[0] == '':
                 continue
             data_size, data_renewal = -1, None
@@ -211,17 +414,235 @@ def grab_vi(driver):
                 else:
                     raise ValueError(f"Unknown {data_size_unit = }")
             # Log everything
-            df.at[i, df.columns[0]] = int(cost)
-            df.at[i, df.columns[1]] = float(pack_dur)
-            df.at[i, df.columns[2]] = float(data_size)
-            df.at[i, df.columns[3]] = data_renewal.title()
-            i += 1
+            plans.append(cost, pack_dur, data_size, 
+                        data_renewal.title())
         dfs["names"].append(sheet_name)
-        dfs["pd"].append(df)
+        dfs["pd"].append(plans.to_frame())
+    return dfs
+
+
+# %%
+parsers = {
+    "airtel": parse_airtel,
+    "vi": parse_vi,
+}
+
+
+# %%
+def plans_table(all_dfs: dict) -> pd.DataFrame:
+    """
+        Makes one table of the plans of all the providers (`all_dfs`
+        has the provider: sheets, from the parsers). The 'Provider' 
+        and 'Sheet' (name) columns are added to the `sheet_columns`.
+    """
+    frames = [df.assign(**{"Provider": provider, "Sheet": name})
+            for provider, dfs in all_dfs.items()
+            for name, df in zip(dfs["names"], dfs["pd"])]
+    cols = ["Provider", "Sheet"] + sheet_columns
+    if len(frames) == 0:
+        return pd.DataFrame(columns=cols)
+    return pd.concat(frames, ignore_index=True)[cols]
+
+
+# %%
+# Sheets (like the parsers give) of the plans in a table
+def table_sheets(plans: pd.DataFrame, names=None) -> dict:
+    groups = dict(tuple(plans.groupby("Sheet", sort=False)))
+    names = list(groups) if names is None else names  # With empty
+    dfs = {"names": list(names), "pd": []}
+    for name in names:
+        df = groups.get(name, plans.iloc[:0])
+        dfs["pd"].append(df[sheet_columns].reset_index(drop=True))
     return dfs
 
+
+# %%
+def save_snapshot(provider, dfs, store_dir: str, 
+            scraped_at: datetime) -> str:
+    """
+        Saves the plans (sheets) of the provider as a new snapshot 
+        (Parquet file) in the store. The names of the sheets (in 
+        order, including the ones without plans) are saved in the 
+        metadata of the file ('sheets'). Returns the file name.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    plans = plans_table({provider: dfs})
+    plans.insert(0, "Scraped At", pd.Timestamp(scraped_at))
+    os.makedirs(os.path.join(store_dir, provider), exist_ok=True)
+    file = os.path.join(store_dir, provider, 
+            f"{scraped_at.strftime('%Y%m%d-%H%M%S-%f')}.parquet")
+    table = pa.Table.from_pandas(plans, preserve_index=False)
+    table = table.replace_schema_metadata({**table.schema.metadata,
+            b"sheets": json.dumps(list(dfs["names"])).encode()})
+    pq.write_table(table, file)
+    return file
+
+
 # %%
-def analyze_data(provider, sheet_num):
+# Snapshot files of the provider in the store (oldest first)
+def snapshot_files(provider, store_dir: str) -> list[str]:
+    folder = os.path.join(store_dir, provider)
+    if not os.path.isdir(folder):
+        return []
+    return [os.path.join(folder, f) for f in sorted(os.listdir(folder))
+            if f.endswith(".parquet")]
+
+
+# %%
+def load_snapshot(provider, store_dir: str):
+    """
+        Loads the latest snapshot of the provider from the store (as
+        sheets, like the parsers give).
+    """
+    files = snapshot_files(provider, store_dir)
+    if len(files) == 0:
+        raise FileNotFoundError(f"No snapshots of {provider} in "\
+                                f"{store_dir}")
+    print(f"Using the snapshot: {files[-1]}")
+    import pyarrow.parquet as pq
+    table = pq.read_table(files[-1])
+    names = (table.schema.metadata or {}).get(b"sheets")
+    return table_sheets(table.to_pandas(), None if names is None 
+                        else json.loads(names))
+
+
+# %%
+def load_history(store_dir: str, provider=None) -> pd.DataFrame:
+    """
+        Loads all the snapshots (of the provider, or of all providers)
+        as one table (see `plans_table`, with the 'Scraped At').
+    """
+    providers = [provider] if provider is not None else \
+            sorted(p for p in os.listdir(store_dir) 
+                    if os.path.isdir(os.path.join(store_dir, p)))
+    files = [f for p in providers for f in snapshot_files(p, store_dir)]
+    if len(files) == 0:
+        return pd.DataFrame(columns=["Scraped At", "Provider", "Sheet"]
+                            + sheet_columns)
+    return pd.concat([pd.read_parquet(f) for f in files], 
+                    ignore_index=True)
+
+
+# %%
+history_schema = """
+CREATE TABLE IF NOT EXISTS plans (
+    plan_key TEXT PRIMARY KEY, provider TEXT NOT NULL, 
+    sheet TEXT NOT NULL, cost INTEGER, validity REAL, data_size REAL,
+    data_renewal TEXT, daily_cost REAL);
+CREATE TABLE IF NOT EXISTS plan_events (
+    plan_key TEXT NOT NULL REFERENCES plans(plan_key),
+    scraped_at TEXT NOT NULL, 
+    event TEXT NOT NULL CHECK (event IN ('added', 'removed')),
+    PRIMARY KEY (plan_key, scraped_at));
+CREATE TABLE IF NOT EXISTS scrapes (
+    provider TEXT NOT NULL, scraped_at TEXT NOT NULL, 
+    num_plans INTEGER, num_added INTEGER, num_removed INTEGER,
+    PRIMARY KEY (provider, scraped_at));
+CREATE INDEX IF NOT EXISTS plans_by_sheet 
+    ON plans (provider, sheet, cost, validity);
+CREATE INDEX IF NOT EXISTS plans_by_daily_cost 
+    ON plans (provider, data_renewal, daily_cost);
+CREATE INDEX IF NOT EXISTS plan_events_by_time
+    ON plan_events (scraped_at);
+"""
+
+
+# %%
+# Opens (creates, if needed) the history database
+def open_history(history_db: str) -> sqlite3.Connection:
+    folder = os.path.dirname(history_db)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    con = sqlite3.connect(history_db)
+    con.executescript(history_schema)
+    return con
+
+
+# %%
+# Key of a plan (same for the same plan in every scrape)
+def plan_key(provider, sheet, cost, validity, data_size, renewal):
+    key = f"{provider}|{sheet}|{cost}|{validity!r}|{data_size!r}|"\
+            f"{renewal}"
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+
+# %%
+# Keys of the plans of the provider active after the last scrape
+def active_plan_keys(con, provider, at: str = None) -> set[str]:
+    rows = con.execute("""
+        SELECT p.plan_key FROM plans p WHERE p.provider = ? AND (
+            SELECT e.event FROM plan_events e 
+            WHERE e.plan_key = p.plan_key AND e.scraped_at <= ?
+            ORDER BY e.scraped_at DESC LIMIT 1) = 'added'
+        """, (provider, at or "9999")).fetchall()
+    return {key for key, in rows}
+
+
+# %%
+def update_history(con, provider, dfs, scraped_at: datetime):
+    """
+        Compares the plans (sheets) of the provider with the plans 
+        active after the last scrape and saves the added and removed
+        plans. Returns the (number added, number removed).
+    """
+    at = scraped_at.isoformat(sep=" ", timespec="microseconds")
+    plans = {}  # Key: row of `plans`
+    for sheet, df in zip(dfs["names"], dfs["pd"]):
+        for cost, validity, size, renewal in zip(*(df[c].tolist() 
+                                            for c in sheet_columns)):
+            key = plan_key(provider, sheet, cost, validity, size, 
+                            renewal)
+            daily_cost = cost / validity if validity > 0 else None
+            plans[key] = (key, provider, sheet, cost, validity, size,
+                            renewal, daily_cost)
+    with con:   # One transaction
+        active = active_plan_keys(con, provider)
+        added, removed = plans.keys() - active, active - plans.keys()
+        con.executemany("INSERT OR IGNORE INTO plans VALUES "\
+                "(?, ?, ?, ?, ?, ?, ?, ?)", [plans[k] for k in added])
+        con.executemany("INSERT INTO plan_events VALUES (?, ?, ?)",
+                [(k, at, "added") for k in added] + 
+                [(k, at, "removed") for k in removed])
+        con.execute("INSERT INTO scrapes VALUES (?, ?, ?, ?, ?)",
+                (provider, at, len(plans), len(added), len(removed)))
+    return len(added), len(removed)
+
+
+# %%
+def cheapest_over_time(con, provider, data_renewal: str = "Daily",
+            sheet: Optional[str] = None) -> pd.DataFrame:
+    """
+        The cheapest (daily cost) plan of the provider active after
+        each scrape (for the data renewal, and in the sheet if given).
+        For each scrape, the plans are read in the order of the daily
+        cost (index), till the first one that is active.
+    """
+    query = """
+        SELECT s.scraped_at, p.sheet, p.cost, p.validity, p.data_size,
+            p.daily_cost
+        FROM scrapes s JOIN plans p ON p.plan_key = (
+            SELECT p2.plan_key FROM plans p2
+            WHERE p2.provider = s.provider AND p2.data_renewal = ?
+                AND p2.daily_cost IS NOT NULL 
+                AND (? IS NULL OR p2.sheet = ?) AND (
+                    SELECT e.event FROM plan_events e 
+                    WHERE e.plan_key = p2.plan_key 
+                        AND e.scraped_at <= s.scraped_at
+                    ORDER BY e.scraped_at DESC LIMIT 1) = 'added'
+            ORDER BY p2.daily_cost LIMIT 1)
+        WHERE s.provider = ?
+        ORDER BY s.scraped_at
+        """
+    rows = con.execute(query, (data_renewal, sheet, sheet, 
+                                provider)).fetchall()
+    return pd.DataFrame(rows, columns=["Scraped At", "Sheet", 
+            "Cost (INR)", "Validity (Days)", "Data Size (GB)", 
+            "Daily Cost (INR / Day)"])
+
+
+# %%
+def analyze_data(provider, sheet_num, dfs):
     if sheet_num == -1:
         if provider == "airtel":
             sheet_num = 0
@@ -231,12 +652,9 @@ def analyze_data(provider, sheet_num):
             raise ValueError(f"No default for {provider = }")
     # Now analyse the packs and list them in ascending order of price
     data_renewals = ["Daily", "Data"]
-    # Read the data dump
-    all_packs = pd.read_excel(f"./{provider}-packs.ods", 
-                    sheet_name=None)    # All sheets
-    pack = list(all_packs.keys())[sheet_num]  # The sheet to analyse
-    packs = all_packs[pack]
-    del packs["Unnamed: 0"]
+    # The sheet to analyse
+    pack = dfs["names"][sheet_num]
+    packs = dfs["pd"][sheet_num]
     print(f"Found {len(packs)} packs for '{pack}'")
     # See all data methods
     for data_renewal in data_renewals:
@@ -254,30 +672,112 @@ def analyze_data(provider, sheet_num):
         print(packs_sorted)
 
 
+# %%
+def scrape(provider, args: LocalArgs):
+    """
+        Gets the HTML of the provider (saved or loaded, see `args`) 
+        and returns the parsed plans (sheets).
+    """
+    html_file = args.html_file
+    if args.all_providers:
+        html_file = None if args.html_dir is None else \
+                os.path.join(args.html_dir, f"{provider}-packs.html")
+    if html_file is not None:
+        with open(html_file, encoding="utf-8") as f:
+            html = f.read()
+    else:
+        web_addr = args.addrs.get(provider, web_addrs[provider])
+        if args.fetch == "http":
+            html = fetch_page(web_addr)
+        else:
+            html = grab_page(provider, web_addr, 
+                            args.headless or args.all_providers)
+        save_html = args.save_html
+        if args.all_providers and save_html is not None:
+            os.makedirs(save_html, exist_ok=True)
+            save_html = os.path.join(save_html, 
+                                    f"{provider}-packs.html")
+        if save_html is not None:
+            with open(save_html, "w", encoding="utf-8") as f:
+                f.write(html)
+            print(f"Saved the HTML to: {save_html}")
+    return parsers[provider](html)
+
+
 # %%
 def main(args: LocalArgs):
     print(f"Argument: {args}")
     # Sanity check 
-    if args.net_provider not in web_addrs:
-        raise NotImplementedError(f"Provider: {args.net_provider = }")
-    # Initialize driver
-    driver = webdriver.Chrome()
-    web_addr = web_addrs[args.net_provider]
-    # Load webpage
-    driver.get(web_addr)
-    driver.implicitly_wait(2)   # Max timeout of 2 sec
-    if args.net_provider == "airtel":
-        dfs = grab_airtel(driver)
-    elif args.net_provider == "vi":
-        dfs = grab_vi(driver)
-    # End driver
-    driver.quit()
-    # Save to ODS file
-    with pd.ExcelWriter(f"./{args.net_provider}-packs.ods") as writer:
-        for sheet_name, df in zip(dfs["names"], dfs["pd"]):
-            df.to_excel(writer, sheet_name=sheet_name)
+    providers = list(parsers) if args.all_providers \
+                else [args.net_provider]
+    for provider in providers:
+        if provider not in web_addrs:
+            raise NotImplementedError(f"Provider: {provider = }")
+    # Scrape (the providers together; a failed provider is skipped)
+    all_dfs = {}
+    scraped_at = datetime.now()
+    if args.from_store:
+        for provider in providers:
+            all_dfs[provider] = load_snapshot(provider, args.store_dir)
+    elif len(providers) == 1:
+        all_dfs[providers[0]] = scrape(providers[0], args)
+    else:
+        with ThreadPoolExecutor(max_workers=args.jobs) as ex:
+            futures = {p: ex.submit(scrape, p, args) 
+                        for p in providers}
+            for provider, future in futures.items():
+                try:
+                    all_dfs[provider] = future.result()
+                except Exception:
+                    print(f"Failed to scrape {provider}:")
+                    traceback.print_exc()
+    # Save the snapshots (of the live pages, or if asked)
+    offline = args.fetch == "http" or (args.html_dir if 
+            args.all_providers else args.html_file) is not None
+    keep = not args.from_store and (args.store or not offline)
+    if offline and not args.store and not args.from_store:
+        print("Not saving the plans of saved pages (use --store)")
+    if keep:
+        for provider, dfs in all_dfs.items():
+            file = save_snapshot(provider, dfs, args.store_dir, 
+                                scraped_at)
+            print(f"Saved the plans to: {file}")
+    # Save the changes to the history
+    if args.history_db is not None and keep:
+        con = open_history(args.history_db)
+        for provider, dfs in all_dfs.items():
+            n_add, n_rem = update_history(con, provider, dfs, 
+                                            scraped_at)
+            print(f"History of {provider}: {n_add} plans added, "\
+                    f"{n_rem} removed")
+        con.close()
+    # Export to ODS file
+    if args.export_ods:
+        for provider, dfs in all_dfs.items():
+            with pd.ExcelWriter(f"./{provider}-packs.ods") as writer:
+                for sheet_name, df in zip(dfs["names"], dfs["pd"]):
+                    df.to_excel(writer, sheet_name=sheet_name)
+        if args.all_providers:
+            plans = plans_table(all_dfs)
+            with pd.ExcelWriter("./all-packs.ods") as writer:
+                plans.to_excel(writer, sheet_name="Plans", index=False)
+            print(f"Exported {len(plans)} plans of {len(all_dfs)} "\
+                    "providers to: ./all-packs.ods")
     print("=========== Data Analysis ===========")
-    analyze_data(args.net_provider, args.sheet_num)
+    for provider, dfs in all_dfs.items():
+        if args.all_providers:
+            print(f"----------- {provider} -----------")
+        analyze_data(provider, -1 if args.all_providers 
+                    else args.sheet_num, dfs)
+    if args.show_history and args.history_db is not None:
+        print("=========== History ===========")
+        con = open_history(args.history_db)
+        for provider in all_dfs:
+            for data_renewal in ["Daily", "Data"]:
+                print(f"Cheapest '{data_renewal}' plans of {provider} "\
+                        "over time")
+                print(cheapest_over_time(con, provider, data_renewal))
+        con.close()
 
 
 if __name__ == "__main__" and "ipykernel" not in sys.argv[0]:
@@ -297,16 +797,27 @@ if __name__ == "__main__" and "ipykernel" not in sys.argv[0]:
 # %%
 # Experimental section
 
+# %%
+# Only when interactive (the module is also imported by other scripts)
+interactive = "ipykernel" in sys.argv[0]
+if interactive:
+    from selenium import webdriver
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver import ActionChains
+    from selenium.common.exceptions import \
+            ElementClickInterceptedException
+
 # %%
 web_addrs_ = {
     "airtel": "https://www.airtel.in/recharge-online",
     "vi": "https://www.myvi.in/prepaid/online-mobile-recharge",
     "jio": "https://www.jio.com/selfcare/plans/mobility/prepaid-plans-list/"
 }
-driver = webdriver.Chrome()
-web_addr = web_addrs_["jio"]
-driver.get(web_addr)
-driver.implicitly_wait(2)
+if interactive:
+    driver = webdriver.Chrome()
+    web_addr = web_addrs_["jio"]
+    driver.get(web_addr)
+    driver.implicitly_wait(2)
 
 # %%
 def grab_jio(driver):
@@ -350,45 +861,47 @@ def grab_jio(driver):
             if packs_header.get_attribute("aria-expanded") == "false":
                 pass
 
-grab_jio(driver)
+if interactive:
+    grab_jio(driver)
 
 # %%
-dfs = { # The names of the plans (spreadsheet) and their content
-    "names": [],
-    "pd": [],
-}
-sidebar_elem = driver.find_element(By.CLASS_NAME, 
-                                    "simplebar-content")
-plan_buttons = sidebar_elem.find_elements(By.TAG_NAME, "button")
-plan_sheets = ["Popular Plans", "JioPhone", "Data Packs"]
-plan_sheets = ["Popular Plans"]
-for plan_button in plan_buttons:
-    if plan_button.text not in plan_sheets:
-        # Not paying focus on these plans
-        continue
-    print(plan_button.text)
-    ActionChains(driver).click(plan_button).perform()
-    # Each plan sheet has many categories for packs
-    elems = driver.find_elements(By.ID, "ISDContainer")
-    for elem in elems:
-        packs_header = elem.find_element(By.CLASS_NAME, 
-                                    "j-accordion-panel")
-        packs_header_title = packs_header.find_element(By.CLASS_NAME,
-                                    "j-listBlock__block-text")
-        header_title = packs_header_title.text
-        if header_title.find("Plans") != -1:
-            header_title = header_title[:header_title.find("Plans")-1]
-        else:
-            header_title = header_title[:header_title.find("(")-1]
-        if header_title == "Top Trending":
-            # Don't need to see summary over entire data
+if interactive:
+    dfs = { # The names of the plans (spreadsheet) and their content
+        "names": [],
+        "pd": [],
+    }
+    sidebar_elem = driver.find_element(By.CLASS_NAME, 
+                                        "simplebar-content")
+    plan_buttons = sidebar_elem.find_elements(By.TAG_NAME, "button")
+    plan_sheets = ["Popular Plans", "JioPhone", "Data Packs"]
+    plan_sheets = ["Popular Plans"]
+    for plan_button in plan_buttons:
+        if plan_button.text not in plan_sheets:
+            # Not paying focus on these plans
             continue
-        print(f"----> {header_title}")
-        # Expand category
-        if packs_header.get_attribute("aria-expanded") == "false":
-            ActionChains(driver).click(packs_header_title).perform()
-        packs_grid = packs_header.find_element(By.CLASS_NAME,
-                                    "j-accordion-panel__inner")
+        print(plan_button.text)
+        ActionChains(driver).click(plan_button).perform()
+        # Each plan sheet has many categories for packs
+        elems = driver.find_elements(By.ID, "ISDContainer")
+        for elem in elems:
+            packs_header = elem.find_element(By.CLASS_NAME, 
+                                        "j-accordion-panel")
+            packs_header_title = packs_header.find_element(By.CLASS_NAME,
+                                        "j-listBlock__block-text")
+            header_title = packs_header_title.text
+            if header_title.find("Plans") != -1:
+                header_title = header_title[:header_title.find("Plans")-1]
+            else:
+                header_title = header_title[:header_title.find("(")-1]
+            if header_title == "Top Trending":
+                # Don't need to see summary over entire data
+                continue
+            print(f"----> {header_title}")
+            # Expand category
+            if packs_header.get_attribute("aria-expanded") == "false":
+                ActionChains(driver).click(packs_header_title).perform()
+            packs_grid = packs_header.find_element(By.CLASS_NAME,
+                                        "j-accordion-panel__inner")
 
 
 # %%
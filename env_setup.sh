@@ -231,8 +231,10 @@ else
 fi
 conda_install -c conda-forge einops
 conda_install -c conda-forge selenium
+conda_install -c conda-forge lxml
 conda_install -c conda-forge pandas
 conda_install -c conda-forge odfpy
+conda_install -c conda-forge pyarrow
 conda_install -c conda-forge tyro
 conda_install -c conda-forge pypdf2
 conda_install -c conda-forge joblib